@@ -1,6 +1,9 @@
 # Compression Decompression
 from compress import *
 from decompress import *
+from structure_codec import *
+from codec_registry import *
+from compressed_search import search_compressed
 
 # XML to JSON
 from xml_editor_json import xml_editor_json
@@ -26,16 +29,73 @@ from PostSearch import *
 import sys
 import argparse
 
+def positive_int(value):
+    """argparse type for options that must be a whole number above zero."""
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, not {value}")
+    return number
+
 # Command handlers
 def xml_editor_json_main(args):
     print(f"Processing 'xml_editor json' command...")
-    xml_editor_json(args.input, args.output)
+    if args.record is not None and not args.jsonl:
+        print("Error: --record only works with --jsonl.")
+        sys.exit(1)
+    if not xml_editor_json(args.input, args.output, args.stream, (args.record or "user") if args.jsonl else None,
+                           args.select.split(",") if args.select else None):
+        sys.exit(1)
 
 def xml_editor_compress_main(args):
+    if args.train_dict:
+        train_dictionary(args.train_dict, args.output)
+        return
+    if not args.input:
+        print("Please provide an input file (-i) or a corpus directory (--train-dict).")
+        return
     if not args.input.endswith('.xml'):
         print("Unsupported file format. Please use .xml files.")
         return
-    compress_xml(args.input, args.output)
+    if args.codec == "auto":
+        try:
+            codec, results = choose_codec(args.input)
+        except OSError as e:
+            print(f"Error sampling input file: {e}")
+            return
+        for name, ratio, seconds, score in results:
+            print(f"  {name:<8} ratio {ratio:6.2f}  {seconds:8.3f} s  score {score:6.2f}")
+        print(f"Using codec '{codec.name}'.")
+    else:
+        codec = get_codec(args.codec)
+    if codec.codec_id == CODEC_BPE and args.entropy == "huffman":
+        codec = get_codec("huffman")
+    if codec.codec_id != CODEC_BPE and (args.dict or args.structure):
+        print("--dict and --structure only work with the bpe and huffman codecs.")
+        return
+    if args.structure and codec.huffman:
+        print("--structure does not support Huffman coding. Use --codec bpe without --entropy huffman.")
+        return
+    if args.structure and (args.stream or args.jobs > 1 or args.user_index):
+        print("--structure compresses the whole file in memory and cannot be combined with --stream, --jobs or --user-index.")
+        return
+
+    if args.dict:
+        try:
+            merges = load_dictionary(args.dict)
+        except (OSError, ValueError) as e:
+            print(f"Error loading dictionary: {e}")
+            return
+        compress_xml_stream(args.input, args.output, args.block_size, merges, args.jobs, args.user_index,
+                            external_dictionary=True, codec=codec, check=args.check)
+    elif args.structure:
+        compress_xml_structured(args.input, args.output, check=args.check)
+    elif args.stream or args.jobs > 1 or codec.codec_id != CODEC_BPE:
+        compress_xml_stream(args.input, args.output, args.block_size, jobs=args.jobs, index_users=args.user_index,
+                            codec=codec, check=args.check)
+    else:
+        # raw=True: every codec compresses the input bytes as they are (the bytes choose_codec sampled)
+        compress_xml(args.input, args.output, index_users=args.user_index, huffman=codec.huffman, raw=True,
+                     check=args.check, block_size=args.block_size)
 
 def xml_editor_decompress_main(args):
     if not args.input.endswith('.comp'):
@@ -44,17 +104,55 @@ def xml_editor_decompress_main(args):
     if not args.output.endswith('.xml'):
         print("Unsupported file format for output. Please use .xml files.")
         return
-    decompress_xml(args.input, args.output)
+    if args.range:
+        try:
+            start, end = (int(part) for part in args.range.split(":"))
+        except ValueError:
+            print("Invalid range. Use START:END byte offsets, for example --range 0:4096.")
+            return
+        decompress_range(args.input, args.output, start, end, args.dict)
+    elif args.user:
+        decompress_user(args.input, args.output, args.user, args.dict)
+    else:
+        decompress_xml(args.input, args.output, args.jobs, args.dict)
 
 def xml_editor_verify_main(args):
+    if args.max_errors is not None and (args.input_dir or not args.stream):
+        print("Error: --max-errors only works with --stream on a single --input file.")
+        return
+
+    if args.input_dir:
+        report = verify_directory(args.input_dir, args.jobs, args.report)
+        if report is None or report["invalid"] or report["error"]:
+            sys.exit(1)
+        return
+
+    if args.stream:
+        if args.fix:
+            print("Error: --fix needs the whole file and cannot be combined with --stream.")
+            return
+        count = verify_stream(args.input, args.max_errors, args.jobs)
+        if count != 0:
+            sys.exit(1)
+        return
+
     try:
-        with open(args.input, "r") as file:
-            xml_lines = file.readlines()
+        if is_well_formed(args.input):
+            # Accepted by expat: nothing for the detailed checker to find
+            xml_lines = None
+            is_valid, errors = True, []
+        elif args.jobs > 1:
+            xml_lines = None
+            errors = list(iter_file_errors(args.input, args.jobs))
+            is_valid = len(errors) == 0
+        else:
+            with open(args.input, "r") as file:
+                xml_lines = file.readlines()
+            is_valid, errors = check_xml_consistency(xml_lines)
     except FileNotFoundError:
         print(f"Error: The file '{args.input}' was not found.")
         return
 
-    is_valid, errors = check_xml_consistency(xml_lines)
     if is_valid is None:
         return
 
@@ -66,18 +164,21 @@ def xml_editor_verify_main(args):
             print(f"Error on line {line_num}: {error}")
 
     if args.fix:
-        fixed_lines, error_log = fix_xml_consistency(xml_lines, errors)
+        if xml_lines is None:
+            with open(args.input, "r") as file:
+                xml_lines = file.readlines()
+        inserts, replacements, error_log = plan_fixes(xml_lines, errors)
         if error_log:
             print("\nFixes applied:")
             for log in error_log:
                 print(log)
         if args.output:
             with open(args.output, "w") as output_file:
-                output_file.writelines(fixed_lines)
+                output_file.writelines(apply_fixes(xml_lines, inserts, replacements))
             print(f"\nFixed XML saved to {args.output}")
         else:
             print("\nFixed XML (printed below):")
-            print("".join(fixed_lines))
+            print("".join(apply_fixes(xml_lines, inserts, replacements)))
 
 def xml_editor_format_main(args):
     """
@@ -123,6 +224,13 @@ def xml_editor_search_main(args):
     """
     print(f"Processing 'xml_editor search' command...")
     xml_file_name = args.input
+    if xml_file_name.endswith('.comp'):
+        # Search the archive in the compressed domain instead of decompressing it first
+        if args.word:
+            search_compressed(xml_file_name, args.word, args.dict)
+        else:
+            print("Only word search (-w) is supported on .comp files.")
+        return
     results = parse_xml_to_graph(xml_file_name)
     graph = results[0]
     posts = results[1]
@@ -212,6 +320,10 @@ def main():
     )
     json_parser.add_argument("-i", "--input", required=True, help="Input XML file.")
     json_parser.add_argument("-o", "--output", required=True, help="Output JSON file.")
+    json_parser.add_argument("--stream", action="store_true", help="Convert while reading, for files larger than memory; elements with the same name must be next to each other.")
+    json_parser.add_argument("--jsonl", action="store_true", help="Write one compact JSON line per record element.")
+    json_parser.add_argument("--record", help="Tag name of the record element (needs --jsonl, default: user).")
+    json_parser.add_argument("--select", metavar="PATH[,PATH...]", help="Only convert these paths, such as users/user/id,users/user/name.")
     json_parser.set_defaults(func=xml_editor_json_main)
     
     # Define the 'xml_editor compress' command
@@ -219,8 +331,18 @@ def main():
         "compress",
         help="Compress XML files."
     )
-    compress_parser.add_argument("-i", "--input", required=True, help="Input XML file.")
-    compress_parser.add_argument("-o", "--output", required=True, help="Output compressed file.")
+    compress_parser.add_argument("-i", "--input", help="Input XML file.")
+    compress_parser.add_argument("-o", "--output", required=True, help="Output compressed file (or dictionary file with --train-dict).")
+    compress_parser.add_argument("--stream", action="store_true", help="Compress block by block with bounded memory (no XML parsing).")
+    compress_parser.add_argument("--block-size", type=positive_int, default=BLOCK_SIZE, help="Input bytes per block, on every compression path (default: 1 MiB).")
+    compress_parser.add_argument("-j", "--jobs", type=int, default=1, help="Worker processes used to encode blocks (implies --stream when above 1).")
+    compress_parser.add_argument("--user-index", action="store_true", help="Index <user> records by id for decompress --user.")
+    compress_parser.add_argument("--train-dict", metavar="CORPUS_DIR", help="Learn a shared dictionary from the .xml files in CORPUS_DIR and save it to --output.")
+    compress_parser.add_argument("--dict", help="Compress with a shared dictionary instead of learning a merge table.")
+    compress_parser.add_argument("--codec", choices=["bpe", "lz77", "huffman", "zlib", "auto"], default="bpe", help="Block codec; auto tries each on a sample of the file (default: bpe).")
+    compress_parser.add_argument("--entropy", choices=["none", "huffman"], default="none", help="Entropy coding of the symbol stream (default: none).")
+    compress_parser.add_argument("--check", action="store_true", help="Refuse input that is not well-formed XML (streaming check, no DOM).")
+    compress_parser.add_argument("--structure", action="store_true", help="Separate tags from text and compress the text of each tag path on its own.")
     compress_parser.set_defaults(func=xml_editor_compress_main)
     
     # Define the 'xml_editor decompress' command
@@ -230,6 +352,10 @@ def main():
     )
     decompress_parser.add_argument("-i", "--input", required=True, help="Input compressed file.")
     decompress_parser.add_argument("-o", "--output", required=True, help="Output XML file.")
+    decompress_parser.add_argument("-j", "--jobs", type=int, default=1, help="Worker processes used to decode blocks.")
+    decompress_parser.add_argument("--range", help="Decode only original bytes START:END.")
+    decompress_parser.add_argument("--user", help="Decode only the <user> record with this id (needs --user-index at compression).")
+    decompress_parser.add_argument("--dict", help="Shared dictionary the file was compressed with.")
     decompress_parser.set_defaults(func=xml_editor_decompress_main)
     
     # Define the 'xml_editor verify' command
@@ -237,9 +363,15 @@ def main():
         "verify",
         help="Verify and fix XML files."
     )
-    verify_parser.add_argument("-i", "--input", required=True, help="Input XML file.")
+    verify_source = verify_parser.add_mutually_exclusive_group(required=True)
+    verify_source.add_argument("-i", "--input", help="Input XML file.")
+    verify_source.add_argument("--input-dir", help="Verify every XML file in this directory and write one report.")
     verify_parser.add_argument("-f", "--fix", action="store_true", help="Attempt to fix errors in the XML file.")
     verify_parser.add_argument("-o", "--output", help="Output file for the fixed XML.")
+    verify_parser.add_argument("--stream", action="store_true", help="Read the file in chunks and print errors as JSON lines; exit with status 1 if any.")
+    verify_parser.add_argument("--max-errors", type=positive_int, help="Stop after this many errors (needs --stream).")
+    verify_parser.add_argument("-j", "--jobs", type=int, default=1, help="Worker processes used to check the file (or the files of --input-dir).")
+    verify_parser.add_argument("--report", help="With --input-dir, JSON file for the report (printed if omitted).")
     verify_parser.set_defaults(func=xml_editor_verify_main)
     
     # Define the 'xml_editor format' command
@@ -276,7 +408,8 @@ def main():
     )
     search_parser.add_argument("-w", "--word", help="Word to search for in post bodies", type=str)
     search_parser.add_argument("-t", "--topic", help="Topic to search for", type=str)
-    search_parser.add_argument("-i", "--input", required=True, help="Input XML file", type=str)
+    search_parser.add_argument("-i", "--input", required=True, help="Input XML file or .comp archive", type=str)
+    search_parser.add_argument("--dict", help="Shared dictionary the .comp archive was compressed with.")
     search_parser.set_defaults(func=xml_editor_search_main)   
     
     # Define the 'xml_editor suggest' command for user suggestions
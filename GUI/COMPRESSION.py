@@ -1,47 +1,294 @@
 import xml.etree.ElementTree as ET
 import json
-import sys
-from collections import Counter
+import heapq
+from array import array
+from collections import Counter, defaultdict
 
-def byte_pair_encoding(data):
+# Default limits for the merge loop. Every merge has to pay for its own dictionary entry,
+# so pairs that occur fewer than MIN_PAIR_FREQUENCY times are not worth replacing.
+MAX_MERGES = 4096
+MIN_PAIR_FREQUENCY = 4
+
+# Separates the compressed text from its JSON mapping in the GUI's text format
+MAP_SEPARATOR = "\n===JSON_MAP===\n"
+
+# Most UTF-8 bytes one replaced occurrence can save: two 3-byte characters become one 2-byte one
+MAX_SAVING_PER_OCCURRENCE = 4
+
+
+class PairMerger:
     """
-    Performs Byte Pair Encoding (BPE) compression on the given data.
+    Incremental pair-count engine used by Byte Pair Encoding.
+
+    The symbols are kept in a doubly linked list (three parallel integer arrays) so a merge only
+    touches the positions where the merged pair actually occurs. Pair frequencies live in a
+    dictionary and are mirrored in a max-heap with lazy deletion, so the next most frequent pair
+    is found in O(log P) instead of recounting the whole sequence.
+
+    merge_most_frequent(new_symbol, min_frequency): Replaces every occurrence of the most frequent pair.
+    merge(pair, new_symbol): Replaces every occurrence of the given pair.
+    result(): Returns the remaining symbols in order.
+
+    Time Complexity:
+        - Building the index: O(n), where n is the number of input symbols.
+        - One merge: O(k log P), where k is the number of occurrences of the merged pair.
+        - Total: O(n log P) over all merges, since every merge removes k symbols for good.
     """
-    mapping = {}
-    step_count = 0
-    initial_size = len(data)
-    current_dict_size = 0
-    current_size = len(data)
-
-    def get_pairs(data):
-        pairs = Counter(zip(data, data[1:]))  # Generate pairs and count them
-        unique_pairs = len(pairs) == len(data) - 1  # Check if all pairs are unique
-        number_of_pairs = len(pairs)  # Total unique pairs
-        return pairs, unique_pairs, number_of_pairs
-    
-    for i in range(0, 10):
-        pairs, unique_pairs, number_of_pairs = get_pairs(data)
-        step_count += 1
-        if not pairs or unique_pairs:
-            break
-        
-        most_frequent = max(pairs, key=pairs.get)
-        most_frequent_value = pairs[most_frequent]
 
-        if most_frequent_value < initial_size * 1 / 100:
+    def __init__(self, symbols):
+        self.symbols = array('i')
+        self.symbols.extend(symbols)  # also accepts bytes, which array() would read as raw machine ints
+        n = len(self.symbols)
+        self.next = array('i', range(1, n + 1))
+        self.prev = array('i', range(-1, n - 1))
+        if n:
+            self.next[-1] = -1
+
+        # pair -> number of live occurrences, pair -> left positions (may contain stale entries)
+        self.counts = Counter(zip(self.symbols, self.symbols[1:]))
+        self.positions = defaultdict(lambda: array('i'))
+        for i in range(n - 1):
+            self.positions[(self.symbols[i], self.symbols[i + 1])].append(i)
+
+        self.heap = [(-count, pair) for pair, count in self.counts.items()]
+        heapq.heapify(self.heap)
+
+    def most_frequent(self):
+        """Return (pair, count) for the most frequent live pair, or None if there is none."""
+        heap = self.heap
+        counts = self.counts
+        while heap:
+            negative_count, pair = heap[0]
+            if counts.get(pair, 0) == -negative_count:
+                return pair, -negative_count
+            heapq.heappop(heap)  # stale entry, a fresher one was pushed when the count changed
+        return None
+
+    def merge(self, pair, new_symbol):
+        """
+        Replace every non-overlapping occurrence of `pair` with `new_symbol`.
+
+        Returns the number of occurrences that were replaced.
+        """
+        first, second = pair
+        symbols, nxt, prv = self.symbols, self.next, self.prev
+        counts, positions = self.counts, self.positions
+        touched = set()
+        merged = 0
+
+        occurrences = positions.pop(pair, ())
+        if first == second:
+            # runs like "aaa" must be merged left to right
+            occurrences = sorted(occurrences)
+
+        for i in occurrences:
+            if symbols[i] != first:
+                continue
+            j = nxt[i]
+            if j == -1 or symbols[j] != second:
+                continue
+
+            left = prv[i]
+            right = nxt[j]
+
+            # The pairs around the occurrence disappear ...
+            if left != -1:
+                old = (symbols[left], first)
+                counts[old] -= 1
+                touched.add(old)
+            if right != -1:
+                old = (second, symbols[right])
+                counts[old] -= 1
+                touched.add(old)
+
+            # ... the two nodes collapse into one ...
+            symbols[i] = new_symbol
+            symbols[j] = -1
+            nxt[i] = right
+            if right != -1:
+                prv[right] = i
+            merged += 1
+
+            # ... and the new neighbouring pairs appear.
+            if left != -1:
+                new = (symbols[left], new_symbol)
+                counts[new] += 1
+                positions[new].append(left)
+                touched.add(new)
+            if right != -1:
+                new = (new_symbol, symbols[right])
+                counts[new] += 1
+                positions[new].append(i)
+                touched.add(new)
+
+        counts.pop(pair, None)
+        touched.discard(pair)
+        for other in touched:
+            count = counts.get(other, 0)
+            if count > 0:
+                heapq.heappush(self.heap, (-count, other))
+            else:
+                counts.pop(other, None)
+                positions.pop(other, None)
+        return merged
+
+    def merge_most_frequent(self, new_symbol, min_frequency=2):
+        """
+        Merge the most frequent pair into `new_symbol` if it occurs at least `min_frequency` times.
+
+        Returns the merged pair, or None if no pair is frequent enough.
+        """
+        best = self.most_frequent()
+        if best is None or best[1] < max(2, min_frequency):
+            return None
+        pair = best[0]
+        self.merge(pair, new_symbol)
+        return pair
+
+    def result(self):
+        """Return the current symbol sequence as a list of integers."""
+        symbols, nxt = self.symbols, self.next
+        output = []
+        i = 0 if len(symbols) else -1
+        while i != -1:
+            output.append(symbols[i])
+            i = nxt[i]
+        return output
+
+
+def learn_merges(symbols, first_symbol, max_merges=MAX_MERGES, min_frequency=MIN_PAIR_FREQUENCY):
+    """
+    Run Byte Pair Encoding over a sequence of integer symbols.
+
+    Parameters:
+    -----------
+    symbols : iterable of int
+        The input sequence.
+    first_symbol : int
+        The integer given to the first new symbol; merge n produces symbol first_symbol + n.
+    max_merges : int
+        Upper bound on the number of merges.
+    min_frequency : int
+        Pairs that occur fewer times than this are not merged.
+
+    Returns:
+    --------
+    tuple : (list, list)
+        - The encoded symbol sequence.
+        - The merge table, a list of (left, right) pairs in the order they were learned.
+    """
+    merger = PairMerger(symbols)
+    merges = []
+    while len(merges) < max_merges:
+        pair = merger.merge_most_frequent(first_symbol + len(merges), min_frequency)
+        if pair is None:
             break
+        merges.append(pair)
+    return merger.result(), merges
+
+
+def _utf8_size(symbol):
+    """Return the number of bytes of chr(symbol) in UTF-8."""
+    return 1 if symbol < 0x80 else 2 if symbol < 0x800 else 3 if symbol < 0x10000 else 4
+
 
-        new_char = chr(len(mapping) + 256)
-        mapping[new_char] = most_frequent
-        data = data.replace(''.join(most_frequent), new_char)
+def _map_entry_size(new_symbol, first, second):
+    """Return the number of bytes the entry of one merge adds to the JSON mapping (indent=4)."""
+    entry = json.dumps({chr(new_symbol): (chr(first), chr(second))}, indent=4)
+    return len(entry) - len("{\n\n}") + len(",\n")
 
-        if (current_size - len(data) - (sys.getsizeof(mapping) - current_dict_size)) < initial_size / 100:
+
+def _learn_paying_merges(symbols, first_symbol, max_merges, min_frequency):
+    """
+    Like learn_merges, but keep only the prefix of the merges that makes the text format smallest.
+
+    Every merge changes the UTF-8 size of the compressed text by the occurrences it replaces and adds
+    an entry to the JSON mapping. A merge can cost more than it saves (two ASCII characters become one
+    2-byte character) and still pay off through the merges built on top of it, so the size is tracked
+    after every merge and the best prefix is kept. Learning stops once the most frequent pair could not
+    pay for its entry even at the best saving per occurrence, as no later pair occurs more often.
+    The symbols of the merges after the best prefix are expanded back into the pairs they replaced.
+    """
+    merger = PairMerger(symbols)
+    merges = []
+    size = best_size = sum(map(_utf8_size, symbols))
+    best_count = 0
+    while len(merges) < max_merges:
+        best = merger.most_frequent()
+        if best is None or best[1] < max(2, min_frequency):
             break
-        else:
-            current_dict_size = sys.getsizeof(mapping)
-            current_size = len(data)
+        (first, second), count = best
+        new_symbol = first_symbol + len(merges)
+        entry_size = _map_entry_size(new_symbol, first, second)
+        if count * MAX_SAVING_PER_OCCURRENCE <= entry_size:
+            break
+        merged = merger.merge((first, second), new_symbol)
+        merges.append((first, second))
+        size += merged * (_utf8_size(new_symbol) - _utf8_size(first) - _utf8_size(second)) + entry_size
+        if size < best_size:
+            best_size, best_count = size, len(merges)
+
+    limit = first_symbol + best_count
+    encoded = []
+    for symbol in merger.result():
+        stack = [symbol]
+        while stack:
+            symbol = stack.pop()
+            if symbol < limit:
+                encoded.append(symbol)
+            else:
+                first, second = merges[symbol - first_symbol]
+                stack += (second, first)
+    return encoded, merges[:best_count]
+
+
+def byte_pair_encoding(data, max_merges=MAX_MERGES, min_frequency=MIN_PAIR_FREQUENCY):
+
+    """
+    Perform Byte Pair Encoding (BPE) on the input data.
+
+    This function compresses a string by iteratively replacing the most frequent adjacent character pairs with a new character.
+    It returns the compressed data and the mapping of replacements used during compression.
+    Pair counts are updated incrementally by `PairMerger`, so each merge costs time in proportion to the occurrences
+    it touches and hundreds or thousands of merges stay affordable on large inputs.
+    Only the merges that pay for their entries in the JSON mapping are kept (see _paying_merges), so the
+    text written by compress_xml_content is never larger than it has to be.
+
+    Parameters:
+    -----------
+    data : str
+        The input string to be compressed.
+    max_merges : int
+        Upper bound on the number of new characters introduced.
+    min_frequency : int
+        Stop once the most frequent pair occurs fewer times than this.
+
+    Returns:
+    --------
+    tuple : (str, dict)
+        - Compressed string after applying BPE.
+        - Dictionary mapping new characters to the replaced pairs.
+    """
+
+    if not data:
+        return data, {}
+
+    symbols = [ord(char) for char in data]
+
+    # New characters must not collide with characters of the input and must stay out of the
+    # surrogate range, otherwise the result could not be written as UTF-8.
+    first_symbol = max(256, max(symbols) + 1)
+    if first_symbol < 0xE000 and first_symbol + max_merges > 0xD800:
+        first_symbol = 0xE000
+    max_merges = max(0, min(max_merges, 0x110000 - first_symbol))
+
+    encoded, merges = _learn_paying_merges(symbols, first_symbol, max_merges, min_frequency)
+
+    mapping = {}
+    for n, (first, second) in enumerate(merges):
+        mapping[chr(first_symbol + n)] = (chr(first), chr(second))
 
-    return data, mapping
+    return ''.join(map(chr, encoded)), mapping
 
 def compress_xml_content(xml_data):
     """
@@ -52,7 +299,7 @@ def compress_xml_content(xml_data):
         compressed_data, mapping = byte_pair_encoding(xml_data)
 
         # Format the output
-        output = f"{compressed_data}\n===JSON_MAP===\n{json.dumps(mapping, indent=4)}"
+        output = f"{compressed_data}{MAP_SEPARATOR}{json.dumps(mapping, indent=4)}"
         return output
     except Exception as e:
         raise ValueError(f"Error compressing XML data: {e}")
\ No newline at end of file
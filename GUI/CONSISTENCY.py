@@ -1,76 +1,288 @@
+from bisect import bisect_left, bisect_right
+import itertools
 
+# Lines between two saved states of IncrementalChecker
+CHECKPOINT_INTERVAL = 200
+
+
+def _line_tags(line, line_num, pending):
+    """
+    Scan one line for tags (see iter_tags).
+
+    pending is (line number, text) of a tag left unfinished by the lines before, or None.
+
+    Returns:
+    --------
+    tuple : (list, tuple)
+        - (line_num, tag_content) of every tag that ends on this line.
+        - The tag left unfinished at the end of this line, or None.
+    """
+    tags = []
+    position = 0
+    if pending is not None:
+        end = line.find(">")
+        if end == -1:
+            return tags, (pending[0], pending[1] + line)
+        tags.append((pending[0], (pending[1] + line[:end]).strip()))
+        position = end + 1
+
+    start = line.find("<", position)
+    while start != -1:
+        end = line.find(">", start)
+        if end == -1:
+            # the tag continues on the next line
+            return tags, (line_num, line[start + 1 :])
+
+        tags.append((line_num, line[start + 1 : end].strip()))
+
+        # Look for the next tag in the line
+        start = line.find("<", end)
+    return tags, None
 
-def check_xml_consistency(xml_lines):
-    tag_list = []  # List to track opened tags with line numbers
-    errors = []  # List to store errors
+
+def iter_tags(xml_lines):
+    """
+    Walk the lines as one token stream and yield (line_num, tag_content) for every tag.
+
+    tag_content is the text between "<" and ">", stripped. A tag may span several lines; its
+    line number is the line of its "<". An unterminated tag at the end of the input runs to the end.
+    """
+    pending = None  # (line number, text) of a tag that continues on the next line
 
     for line_num, line in enumerate(xml_lines, start=1):
-        line = line.strip()
-
-        start = line.find("<")
-        while start != -1:
-            end = line.find(">", start)
-
-            # Extract the tag content
-            tag_content = line[start + 1 : end].strip()
-
-            is_closing = tag_content.startswith("/")
-            is_self_closing = tag_content.endswith("/")
-            comment_tag = tag_content.startswith("!")
-
-            if is_closing:
-                # Extract the tag name for closing tag
-                tag_name = tag_content[1:].split()[0]
-                matched = False
-
-                # Search for matching opening tag in the stack
-                for i in range(len(tag_list) - 1, -1, -1):
-                    list_tag_name, opening_line = tag_list[i]
-                    if list_tag_name == tag_name:
-                        tag_list.pop(i)  # Remove the matched opening tag from the stack
-                        matched = True
-                        break
-
-                if not matched:
-                    # If no matching opening tag, log the error
-                    errors.append(
-                        (
-                            line_num,
-                            f"Unexpected closing tag: </{tag_name}>. There is no matching opening tag.",
-                        )
-                    )
-
-            elif is_self_closing or comment_tag:
-                # Ignore self-closing or comment tags as they don't affect xml structure
-                pass
+        tags, pending = _line_tags(line, line_num, pending)
+        yield from tags
 
-            else:
-                # opening tag, track it with its line number
-                tag_name = tag_content.split()[0]
-                tag_list.append(
-                    (tag_name, line_num)
-                )  # used in order to track opening tag line number in case of many tags with the same name
+    if pending is not None:
+        yield pending[0], pending[1].strip()
+
+
+class _TagStack:
+    """
+    Opening tags that are still open, in document order.
+
+    A closing tag matches the most recent open tag with the same name, even if other tags were
+    opened after it (those stay open). Every name keeps the positions of its own open tags, so
+    both push and close cost O(1) amortized however deep or broken the document is.
+    """
+
+    def __init__(self):
+        self.entries = []  # [tag_name, line_num, is_open]
+        self.positions = {}  # tag_name -> positions in entries of its open tags
+
+    def push(self, tag_name, line_num):
+        self.positions.setdefault(tag_name, []).append(len(self.entries))
+        self.entries.append([tag_name, line_num, True])
 
-            # Look for the next tag in the line
-            start = line.find("<", end)
+    def close(self, tag_name):
+        """Close the most recent open <tag_name>; return False if there is none."""
+        positions = self.positions.get(tag_name)
+        if not positions:
+            return False
+        self.entries[positions.pop()][2] = False
 
+        # Drop closed entries from the top so the list only grows with tags that are really open
+        entries = self.entries
+        while entries and not entries[-1][2]:
+            entries.pop()
+        return True
+
+    def unclosed(self):
+        """Return (tag_name, line_num) of every tag still open, innermost first."""
+        return [(tag_name, line_num) for tag_name, line_num, is_open in reversed(self.entries) if is_open]
+
+
+def _match_tags(tags, tag_list):
+    """
+    Match a stream of (line_num, tag_content) against the open tags in tag_list.
+
+    Opening tags are pushed onto tag_list and closing tags close the most recent open tag with their
+    name. Yields (line_num, tag_name) for every closing tag that has no open tag to close.
+    """
+    for line_num, tag_content in tags:
+        is_closing = tag_content.startswith("/")
+        is_self_closing = tag_content.endswith("/")
+        comment_tag = tag_content.startswith("!") or tag_content.startswith("?")
+
+        if is_closing:
+            # Extract the tag name for closing tag
+            name = tag_content[1:].split()
+            if not name:
+                continue
+            tag_name = name[0]
+
+            # Remove the matching opening tag from the stack
+            if not tag_list.close(tag_name):
+                yield line_num, tag_name
+
+        elif is_self_closing or comment_tag or not tag_content:
+            # Ignore self-closing, comment and declaration tags as they don't affect xml structure
+            pass
+
+        else:
+            # opening tag, track it with its line number
+            tag_list.push(tag_content.split()[0], line_num)
+
+
+def _unexpected_closing(line_num, tag_name):
+    return (
+        line_num,
+        f"Unexpected closing tag: </{tag_name}>. There is no matching opening tag.",
+    )
+
+
+def _unclosed_errors(tag_list):
     #  check if any opening tags are left unclosed
-    while tag_list:
-        tag_name, opening_line = tag_list.pop()
-        errors.append(
-            (
-                opening_line,
-                f"<{tag_name}> has no closing tag.",
-            )
+    for tag_name, opening_line in tag_list.unclosed():
+        yield (
+            opening_line,
+            f"<{tag_name}> has no closing tag.",
         )
 
+
+def iter_errors(tags):
+    """
+    Check a stream of (line_num, tag_content) from iter_tags and yield
+    (line_num, message) for every error as soon as it is known: unexpected closing tags where they
+    occur, tags without a closing tag once the stream ends.
+    """
+    tag_list = _TagStack()  # opened tags with line numbers
+    for line_num, tag_name in _match_tags(tags, tag_list):
+        yield _unexpected_closing(line_num, tag_name)
+    yield from _unclosed_errors(tag_list)
+
+
+def check_xml_consistency(xml_lines):
+    errors = list(iter_errors(iter_tags(xml_lines)))
+
     # return errors if exist and the list of errors
     return len(errors) == 0, errors
 
 
-def fix_xml_consistency(xml_lines, errors):
-    fixed_lines = xml_lines[:]
+def _open_tags(tag_list):
+    return tuple((tag_name, line_num) for tag_name, line_num, is_open in tag_list.entries if is_open)
+
+
+def _tag_stack(open_tags):
+    tag_list = _TagStack()
+    for tag_name, line_num in open_tags:
+        tag_list.push(tag_name, line_num)
+    return tag_list
+
+
+class IncrementalChecker:
+    """
+    check_xml_consistency for a document that is being edited, re-checking only what an edit can change.
+
+    The state of the check (the open tags, and a tag left unfinished at the end of a line) is saved
+    every CHECKPOINT_INTERVAL lines. After an edit the check restarts from the last checkpoint before
+    it, and stops at the first old checkpoint after it whose state is the same as before the edit: from
+    there on everything, errors included, is what it was, moved by the number of lines the edit added
+    or removed. A keystroke therefore re-checks a few hundred lines, however long the document is.
+
+    reset(lines): Check a whole document.
+    edit(lines, first, last, line_delta): Re-check after lines[first:last + 1] were changed and the
+        document got line_delta lines longer; every other line must be as it was.
+    result(): (is_valid, errors), the same as check_xml_consistency(lines).
+    """
+
+    def __init__(self, interval=CHECKPOINT_INTERVAL):
+        self.interval = interval
+        self.reset([])
+
+    def reset(self, lines):
+        self.checkpoint_lines = [0]  # line index of every checkpoint, increasing
+        self.checkpoint_states = [((), None)]  # state before that line: (open tags, unfinished tag)
+        self.errors = []  # (line index, line_num, message) of every unexpected closing tag, in order
+        self.end_state = ((), None)
+        self.edit(lines, 0, len(lines) - 1, 0)
+
+    def edit(self, lines, first, last, line_delta):
+        # Restart from the last checkpoint before the edit; what comes after it is kept aside, to be
+        # reused if the check gets back to the state it had before the edit
+        position = bisect_right(self.checkpoint_lines, first) - 1
+        start = self.checkpoint_lines[position]
+        open_tags, pending = self.checkpoint_states[position]
+        old_lines = self.checkpoint_lines[position + 1 :]
+        old_states = self.checkpoint_states[position + 1 :]
+        del self.checkpoint_lines[position + 1 :]
+        del self.checkpoint_states[position + 1 :]
+        split = bisect_left(self.errors, (start,))
+        old_errors = self.errors[split:]
+        del self.errors[split:]
+        reusable = {index + line_delta: number for number, index in enumerate(old_lines)}
+
+        def moved(line_num):
+            # Lines after the edit moved with it; line_num counts from 1
+            return line_num + line_delta if line_num - 1 > last - line_delta else line_num
+
+        def moved_state(state):
+            open_tags, pending = state
+            open_tags = tuple((tag_name, moved(line_num)) for tag_name, line_num in open_tags)
+            return open_tags, pending and (moved(pending[0]), pending[1])
+
+        tag_list = _tag_stack(open_tags)
+        for index in range(start, len(lines)):
+            number = reusable.get(index) if index > last else None
+            is_checkpoint = index > start and (index - start) % self.interval == 0
+            if number is not None or is_checkpoint:
+                state = (_open_tags(tag_list), pending)
+                if number is not None and moved_state(old_states[number]) == state:
+                    # Same state as before the edit: the rest of the old check still holds
+                    self.checkpoint_lines += [index + line_delta for index in old_lines[number:]]
+                    self.checkpoint_states += [moved_state(state) for state in old_states[number:]]
+                    self.errors += [
+                        (error_index + line_delta, moved(line_num), message)
+                        for error_index, line_num, message in old_errors
+                        if error_index >= old_lines[number]
+                    ]
+                    self.end_state = moved_state(self.end_state)
+                    return
+                if is_checkpoint:
+                    self.checkpoint_lines.append(index)
+                    self.checkpoint_states.append(state)
+
+            tags, pending = _line_tags(lines[index], index + 1, pending)
+            for line_num, tag_name in _match_tags(tags, tag_list):
+                self.errors.append((index,) + _unexpected_closing(line_num, tag_name))
+
+        self.end_state = (_open_tags(tag_list), pending)
+
+    def result(self):
+        open_tags, pending = self.end_state
+        tag_list = _tag_stack(open_tags)
+        errors = [(line_num, message) for _, line_num, message in self.errors]
+        if pending is not None:
+            # An unterminated tag at the end runs to the end, as in iter_tags
+            for line_num, tag_name in _match_tags([(pending[0], pending[1].strip())], tag_list):
+                errors.append(_unexpected_closing(line_num, tag_name))
+        errors += _unclosed_errors(tag_list)
+        return len(errors) == 0, errors
+
+
+def _line_ending(line):
+    return line[len(line.rstrip("\r\n")) :]
+
+
+def plan_fixes(xml_lines, errors):
+    """
+    Work out the repair of every error as a patch on the original lines, without changing them.
+
+    Patches refer to positions in xml_lines, so one repair never shifts the line numbers another
+    one depends on, and the fixed file can be produced in a single pass by apply_fixes.
+
+    Returns:
+    --------
+    tuple : (dict, dict, list)
+        - inserts: line index -> lines to insert before that line (index len(xml_lines) appends).
+        - replacements: line index -> the new text of that line.
+        - error_log: one message per applied fix.
+    """
+    inserts = {}
+    replacements = {}
     error_log = []
+    newline = _line_ending(xml_lines[0]) if xml_lines else "\n"
+    next_tag_line = None
 
     for line_num, error_msg in errors:
         if "has no closing tag" in error_msg:
@@ -79,24 +291,23 @@ def fix_xml_consistency(xml_lines, errors):
 
             # Locate the line with the opening tag
             open_tag_line = line_num - 1
-            for i in range(open_tag_line, len(fixed_lines)):
-                if f"<{tag_name}" in fixed_lines[i]:
+            for i in range(open_tag_line, len(xml_lines)):
+                if f"<{tag_name}" in replacements.get(i, xml_lines[i]):
                     open_tag_line = i
                     break
 
-            # Find the appropriate position to insert the closing tag
-            insertion_point = open_tag_line + 1
-            for i in range(open_tag_line + 1, len(fixed_lines)):
-                if (
-                    fixed_lines[i].strip().startswith("</")
-                    or "<" in fixed_lines[i].strip()
-                ):
-                    break
-                insertion_point = i + 1
+            if next_tag_line is None:
+                # next_tag_line[i]: the first line at or after i that holds a tag. Missing closing tags
+                # are reported after all unexpected closing tags, so the replacements are all known here.
+                next_tag_line = [len(xml_lines)] * (len(xml_lines) + 1)
+                for i in range(len(xml_lines) - 1, -1, -1):
+                    has_tag = "<" in replacements.get(i, xml_lines[i])
+                    next_tag_line[i] = i if has_tag else next_tag_line[i + 1]
 
-            fixed_lines.insert(
-                insertion_point,
-                f"</{tag_name}><!-- Error fixed: Added missing closing tag for <{tag_name}> -->\n",
+            # Insert the closing tag before the next line with a tag
+            insertion_point = next_tag_line[open_tag_line + 1]
+            inserts.setdefault(insertion_point, []).append(
+                f"</{tag_name}><!-- Error fixed: Added missing closing tag for <{tag_name}> -->{newline}"
             )
             error_log.append(
                 f"Added closing tag </{tag_name}> for <{tag_name}> starting on line {line_num}"
@@ -108,7 +319,6 @@ def fix_xml_consistency(xml_lines, errors):
 
             # Locate the line with the closing tag
             closing_tag_line = line_num - 1
-            content = fixed_lines[closing_tag_line].strip()
 
             # Set how many lines to check before the closing tag for content
             lines_to_check = 2
@@ -119,19 +329,42 @@ def fix_xml_consistency(xml_lines, errors):
                 if previous_line < 0:
                     break  # Don't go beyond the first line
 
-                content = fixed_lines[previous_line].strip()
+                content = replacements.get(previous_line, xml_lines[previous_line]).strip()
                 if content:  # Found non-empty content
                     # Add the opening tag before the found content
-                    fixed_lines[previous_line] = f"<{tag_name}> {content}"
-                    fixed_lines[closing_tag_line] = f"</{tag_name}>"
+                    replacements[previous_line] = f"<{tag_name}> {content}" + _line_ending(xml_lines[previous_line])
+                    replacements[closing_tag_line] = f"</{tag_name}>" + _line_ending(xml_lines[closing_tag_line])
                     break  # Stop once content is found and fixed
             else:
                 # If no content found in the range, insert opening tag before closing tag
-                fixed_lines.insert(closing_tag_line, f"<{tag_name}>")
+                inserts.setdefault(closing_tag_line, []).append(f"<{tag_name}>{newline}")
 
             # Log the error fix
             error_log.append(
                 f"Added missing opening tag <{tag_name}> on line {line_num} for existing closing tag."
             )
-            
-    return fixed_lines, error_log
\ No newline at end of file
+
+    return inserts, replacements, error_log
+
+
+def apply_fixes(xml_lines, inserts, replacements):
+    """
+    Yield the fixed lines: one merge pass over the original lines and the patches sorted by position.
+    Runs of unchanged lines are passed through as they are.
+    """
+    lines = iter(xml_lines)
+    position = 0
+    for index in sorted(inserts.keys() | replacements.keys()):
+        yield from itertools.islice(lines, index - position)
+        yield from inserts.get(index, ())
+        position = index
+        if index in replacements:
+            next(lines)
+            yield replacements[index]
+            position += 1
+    yield from lines
+
+
+def fix_xml_consistency(xml_lines, errors):
+    inserts, replacements, error_log = plan_fixes(xml_lines, errors)
+    return list(apply_fixes(xml_lines, inserts, replacements)), error_log
@@ -7,11 +7,49 @@ import json
 import sys
 
 
+def build_expansion_table(mapping):
+    """
+    Compute the full expansion of every encoded character of a BPE mapping.
+
+    Each pair may itself contain encoded characters, so expansions are memoized: every
+    entry is built once from the (already expanded) halves of its pair.
+
+    Parameters:
+    -----------
+    mapping : dict
+        The dictionary mapping encoded characters to the original pairs.
+
+    Returns:
+    --------
+    dict
+        Encoded character -> the original text it stands for.
+
+    Time Complexity: O(K + S), where K is the number of entries and S the total length of the expansions.
+    """
+    expansions = {}
+    for new_char in mapping:
+        # Resolve with an explicit stack so entries can be listed in any order
+        stack = [new_char]
+        while stack:
+            char = stack[-1]
+            if char in expansions:
+                stack.pop()
+                continue
+            pending = [part for part in mapping[char] if part in mapping and part not in expansions]
+            if pending:
+                stack.extend(pending)
+                continue
+            expansions[char] = ''.join(expansions.get(part, part) for part in mapping[char])
+            stack.pop()
+    return expansions
+
+
 def reverse_bpe(data, mapping):
     """
     Reverse the Byte Pair Encoding (BPE) compression to recover the original data.
 
-    This function takes a compressed string and the mapping dictionary used for BPE and replaces encoded characters with their original pairs.
+    This function precomputes the expansion of every encoded character once and then rebuilds the
+    original string in a single pass over the compressed data, instead of one `str.replace` pass per mapping entry.
 
     Parameters:
     -----------
@@ -24,10 +62,12 @@ def reverse_bpe(data, mapping):
     --------
     str
         The decompressed string after reversing BPE.
+
+    Time Complexity: O(K + N), where K is the size of the mapping and N the length of the output.
     """
-    for new_char, pair in reversed(mapping.items()):
-        data = data.replace(new_char, ''.join(pair))
-    return data
+    expansions = build_expansion_table(mapping)
+    get = expansions.get
+    return ''.join([get(char, char) for char in data])
 
 def decompress_xml_content(compressed_data):
     """
@@ -1,3 +1,7 @@
+import io
+import json
+import mmap
+import os
 import re
 
 def tokenize(xml_input):
@@ -188,8 +192,53 @@ def parse(xml_input):
         - Total: O(d + k).
     """
     
-    # Tokenize the input XML string into tags and text
-    tokens = tokenize(xml_input)
+    # Split the input XML string into tags and text lazily, as offsets into it
+    return parse_spans(xml_input)
+
+
+def parse_file(input_file, select=None):
+    """
+    Parses an XML file like parse, without reading it into a string first.
+
+    The file is mapped into memory (mmap) and parsed as bytes; only tag names and the text that ends
+    up in the dictionary are decoded (as UTF-8, with line breaks normalized like a text-mode read).
+
+    Args:
+        input_file (str): Path to the XML file.
+        select (list): Paths such as "users/user/id" to keep (see parse_spans); None keeps everything.
+
+    Returns:
+        dict: A simplified dictionary representing the XML structure.
+
+    Time Complexity: O(n), where n is the size of the file.
+    Space Complexity: O(d + k), as for parse; the mapped file is paged in by the OS.
+    """
+    with open(input_file, "rb") as xml_file:
+        if os.fstat(xml_file.fileno()).st_size == 0:
+            return {}  # an empty file cannot be mapped
+        source = mmap.mmap(xml_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return parse_spans(source, select)
+        finally:
+            try:
+                source.close()
+            except BufferError:
+                pass  # the traceback of an error still holds a match into the map; it is unmapped with it
+
+
+def parse_tokens(tokens):
+    """
+    Builds the nested dictionary of parse from tokens that are already split (see tokenize).
+
+    Args:
+        tokens (iterable): The tags and text of the XML, in document order.
+
+    Returns:
+        dict: A simplified dictionary representing the XML structure.
+
+    Time Complexity: O(t), where t is the number of tokens.
+    Space Complexity: O(d + k), for the depth d of the XML and the size k of the dictionary.
+    """
 
     # Initialize a stack with a root dictionary
     stack = [{}]  # Stack stores dictionaries for nested tags.
@@ -228,101 +277,357 @@ def parse(xml_input):
     return stack[0]
 
 
+# Kinds of the tokens of iter_token_spans; EMPTY is a self-closing tag, which parse ignores. Each kind
+# is the number of the group of TOKEN_SPAN that marks it. SKIPPED is a whole element that
+# iter_selected_spans jumped over.
+END, START, EMPTY, TEXT, SKIPPED = 1, 2, 3, 4, 5
+
+# A token of tokenize with the whitespace before it: a closing tag, a start tag (group 2 is its name),
+# a self-closing tag or text. Whitespace that only comes before a tag or the end of the text is
+# matched with it, so that it is skipped without a token of its own.
+TOKEN_SPAN = re.compile(r"\s*(?:</[^>]*>()|<(?=[^>])\s*([^\s>]*)[^>]*(?:(?<=/)>()|>)|([^<\s][^<]*)|\Z)")
+TOKEN_SPAN_BYTES = re.compile(TOKEN_SPAN.pattern.encode())
+
+
+def iter_token_spans(source):
+    """
+    Lazily splits XML into the same tokens as tokenize, as (kind, start, end, name) records.
+
+    start and end are offsets into source; no token is copied out of it, and a span also covers the
+    whitespace before its token. name is the tag name of a START tag (None otherwise), shared by
+    every tag with that name. Text made only of whitespace is skipped, as parse ignores it.
+
+    Args:
+        source (str, bytes or mmap): The XML text; bytes and memory maps are read as UTF-8.
+
+    Yields:
+        tuple: (kind, start, end, name), in document order; kind is START, END, EMPTY or TEXT.
+
+    Time Complexity: O(n), where n is the length of the XML text.
+    Space Complexity: O(m), where m is the number of distinct tag names.
+    """
+    pattern = TOKEN_SPAN if isinstance(source, str) else TOKEN_SPAN_BYTES
+    names = {}
+    for match in pattern.finditer(source):
+        kind = match.lastindex
+        if kind == START:
+            raw = match.group(START)
+            name = names.get(raw)
+            if name is None:
+                name = names[raw] = raw if isinstance(raw, str) else raw.decode("utf-8")
+            yield START, match.start(), match.end(), name
+        elif kind is not None:  # None: the whitespace at the end of the text
+            yield kind, match.start(), match.end(), None
+
+
+def _closing_offset(source, name, pos, patterns):
+    """Returns the offset just past the closing tag of the <name> element whose content starts at pos."""
+    pattern = patterns.get(name)
+    if pattern is None:
+        # Only the tags named name, to tell the nested ones from the closing tag
+        text = r"<(/?)\s*" + re.escape(name) + r"(?=[\s/>])[^>]*>"
+        pattern = patterns[name] = re.compile(text if isinstance(source, str) else text.encode())
+    slash = "/" if isinstance(source, str) else ord("/")
+    depth = 1
+    for match in pattern.finditer(source, pos):
+        if match.end(1) > match.start(1):
+            depth -= 1
+            if not depth:
+                return match.end()
+        elif source[match.end() - 2] != slash:
+            depth += 1
+    return len(source)
+
+
+def iter_selected_spans(source, select):
+    """
+    Yields the tokens of iter_token_spans that belong to the selected paths, skipping everything else.
+
+    A path lists tag names from the root element down, such as "users/user/id". A selected element
+    comes with all of its content; the elements on the way to it come with their text only. Any other
+    element is jumped over with a search for its closing tag, so none of its tokens are made; a single
+    SKIPPED token stands for it, as its parent still has a child.
+
+    Args:
+        source (str, bytes or mmap): The XML text, assumed well-formed (see verify).
+        select (list): The paths to keep, as "/"-separated tag names; whitespace around the names
+            and blank paths are ignored.
+
+    Yields:
+        tuple: (kind, start, end, name), as iter_token_spans does, plus SKIPPED tokens.
+
+    Time Complexity: O(n) to scan the text, with tokens only for the s characters that are kept.
+    Space Complexity: O(d + m), for the depth d of the XML and the number m of distinct tag names.
+    """
+    pattern = TOKEN_SPAN if isinstance(source, str) else TOKEN_SPAN_BYTES
+    selected = {
+        tuple(name.strip() for name in path.strip().strip("/").split("/")) for path in select if path.strip()
+    }
+    on_the_way = {path[:i] for path in selected for i in range(1, len(path))}
+    names = {}
+    patterns = {}  # closing-tag search patterns of skipped elements, by tag name
+    path = []  # names of the open elements outside selected ones
+    inside = 0  # depth inside a selected element, 0 if outside
+    pos = 0
+    while pos is not None:
+        matches, pos = pattern.finditer(source, pos), None
+        for match in matches:
+            kind = match.lastindex
+            if kind == START:
+                raw = match.group(START)
+                name = names.get(raw)
+                if name is None:
+                    name = names[raw] = raw if isinstance(raw, str) else raw.decode("utf-8")
+                if inside:
+                    inside += 1
+                else:
+                    path.append(name)
+                    key = tuple(path)
+                    if key in selected:
+                        inside = 1
+                    elif key not in on_the_way:
+                        # Jump over the element and start matching again after it
+                        path.pop()
+                        pos = _closing_offset(source, name, match.end(), patterns)
+                        yield SKIPPED, match.start(), pos, name
+                        break
+                yield START, match.start(), match.end(), name
+            elif kind == END:
+                if inside > 1:
+                    inside -= 1
+                else:
+                    inside = 0
+                    path.pop()
+                yield END, match.start(), match.end(), None
+            elif kind is not None:
+                yield kind, match.start(), match.end(), None
+
+
+def span_text(source, start, end):
+    """
+    Returns the text token source[start:end] like get_text_value does, decoding bytes as UTF-8.
+
+    Args:
+        source (str, bytes or mmap): The XML text the offsets point into.
+        start (int): Offset of the token.
+        end (int): Offset just past the token.
+
+    Returns:
+        str: The text without leading/trailing whitespace.
+
+    Time Complexity: O(k), where k is the length of the token.
+    Space Complexity: O(k), for the sliced text.
+    """
+    text = source[start:end]
+    if not isinstance(text, str):
+        text = text.decode("utf-8")
+        if "\r" in text:
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text.strip()
+
+
+def parse_spans(source, select=None):
+    """
+    Builds the nested dictionary of parse from the tokens of iter_token_spans.
+
+    Text is only sliced out of source when the dictionary can still take it: for an element without
+    children or text of its own, or for the latest of a list of siblings.
+
+    With select, only the selected paths and the elements on the way to them are built (see
+    iter_selected_spans): parse's dictionary without the elements that are neither. A skipped child
+    still counts as a child, so text after it is ignored like parse does.
+
+    Args:
+        source (str, bytes or mmap): The XML text.
+        select (list): Paths such as "users/user/id" to keep; None keeps everything.
+
+    Returns:
+        dict: A simplified dictionary representing the XML structure.
+
+    Time Complexity: O(n), where n is the length of the XML text.
+    Space Complexity: O(d + k), for the depth d of the XML and the size k of the dictionary.
+    """
+    stack = [{}]
+    tag_stack = []
+    skipped = [False]  # whether each open element has a child that select skipped
+    tokens = iter_selected_spans(source, select) if select else iter_token_spans(source)
+    for kind, start, end, name in tokens:
+        if kind == START:
+            new_element = {}
+            handle_multiple_siblings(stack, name, new_element)
+            stack.append(new_element)
+            tag_stack.append(name)
+            skipped.append(False)
+
+        elif kind == END:
+            stack.pop()
+            tag_stack.pop()
+            skipped.pop()
+
+        elif kind == SKIPPED:
+            skipped[-1] = True
+
+        elif kind == TEXT:
+            current_tag = tag_stack[-1]
+            value = stack[-2][current_tag]
+            if (value == {} and not skipped[-1]) or isinstance(value, list):
+                text_value = span_text(source, start, end)
+                if text_value:  # Ignore text that is whitespace after all
+                    replace_empty_dict_with_text(stack, current_tag, text_value)
+                    assign_text_to_most_recent_sibling(stack, current_tag, text_value)
+
+    return stack[0]
+
+
+# Characters that have to be escaped inside a JSON string
+ESCAPE = re.compile(r'[\x00-\x1f"\\]')
+ESCAPES = {'"': '\\"', "\\": "\\\\", "\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+
+# Pieces collected by custom_dump before they are written out in one call
+WRITE_BATCH = 4096
+
+
+def _escape_char(match):
+    char = match.group()
+    return ESCAPES.get(char) or f"\\u{ord(char):04x}"
+
+
+def encode_string(text):
+    """
+    Serializes a string as a JSON string literal, escaping quotes, backslashes and control characters.
+
+    Args:
+        text (str): The string to serialize.
+
+    Returns:
+        str: The quoted and escaped string.
+
+    Time Complexity: O(k), where k is the length of the string.
+    Space Complexity: O(k) for the result string.
+    """
+    if ESCAPE.search(text) is None:
+        return f'"{text}"'
+    return '"' + ESCAPE.sub(_escape_char, text) + '"'
+
+
+def _encode_scalar(obj):
+    """
+    Serializes a value that is neither a dictionary nor a list.
+
+    Time Complexity: O(k), where k is the length of the result.
+    Space Complexity: O(k) for the result string.
+    """
+    if isinstance(obj, str):
+        return encode_string(obj)
+    # Booleans are ints too, so they are checked first
+    if obj is True:
+        return "true"
+    if obj is False:
+        return "false"
+    if obj is None:
+        return "null"
+    if isinstance(obj, (int, float)):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def custom_dump(obj, fp, indent=None, level=0):
+    """
+    Serializes a Python object as JSON into a file-like object (an open file or io.StringIO).
+
+    Compact output (indent=None) is exactly what json's C encoder writes with its default
+    separators, so it is left to json.dumps. Indented output, and compact output nested too deeply
+    for the recursive C encoder, works with an explicit stack instead of recursion, so the nesting
+    depth is not limited by Python's recursion limit, and writes the pieces out in batches instead
+    of building a string per level. The indentation prefix of every depth is computed once.
+
+    Args:
+        obj: The Python object to serialize.
+        fp: Anything with a write(str) method.
+        indent: (Optional) Number of spaces for pretty-printing. Defaults to None.
+        level: (Optional) Depth of obj itself, for indentation. Defaults to 0.
+
+    Time Complexity: O(S), where S is the size of the serialized JSON text.
+    Space Complexity: O(d + b), where d is the depth of nested objects and b the write batch;
+    O(S) for compact output.
+    """
+    if indent is None:
+        try:
+            fp.write(json.dumps(obj, ensure_ascii=False))
+            return
+        except RecursionError:
+            pass
+
+    prefixes = []  # prefixes[depth]: line break and indentation of that depth
+
+    def prefix(depth):
+        while len(prefixes) <= depth:
+            prefixes.append("\n" + " " * (len(prefixes) * indent))
+        return prefixes[depth]
+
+    parts = []
+    append = parts.append
+    search = ESCAPE.search
+    stack = []  # [items iterator, is a dictionary, depth, items written so far] of every open container
+    value = obj
+    depth = level
+    while True:
+        # Write the next value; containers are opened and their items written as they come
+        if isinstance(value, dict):
+            append("{" if indent is None else "{" + prefix(depth + 1))
+            stack.append([iter(value.items()), True, depth, 0])
+        elif isinstance(value, list):
+            append("[" if indent is None else "[" + prefix(depth + 1))
+            stack.append([iter(value), False, depth, 0])
+        elif value.__class__ is str and search(value) is None:
+            append(f'"{value}"')
+        else:
+            append(_encode_scalar(value))
+
+        if len(parts) >= WRITE_BATCH:
+            fp.write("".join(parts))
+            parts.clear()
+
+        # Find the next value: the next item of the innermost open container, closing the finished ones
+        while stack:
+            frame = stack[-1]
+            item = next(frame[0], stack)
+            if item is stack:
+                stack.pop()
+                closer = "}" if frame[1] else "]"
+                append(closer if indent is None else prefix(frame[2]) + closer)
+                continue
+            if frame[3]:
+                append(", " if indent is None else "," + prefix(frame[2] + 1))
+            frame[3] += 1
+            if frame[1]:
+                key, value = item
+                append(f'"{key}": ' if key.__class__ is str and search(key) is None else _encode_scalar(key) + ": ")
+            else:
+                value = item
+            depth = frame[2] + 1
+            break
+        else:
+            break
+
+    fp.write("".join(parts))
+
+
 def custom_dumps(obj, indent=None, level=0):
     """
-    Serializes a Python object into a JSON string.
+    Serializes a Python object into a JSON string (see custom_dump).
 
     Args:
         obj: The Python object to serialize.
         indent: (Optional) Number of spaces for pretty-printing. Defaults to None.
-        level: (Internal) Current depth of recursion for indentation. Defaults to 0.
+        level: (Optional) Depth of obj itself, for indentation. Defaults to 0.
 
     Returns:
         str: JSON-compliant string representation of the input object.
 
-    Time Complexity: Depends on the structure:
-       
-         Overall: O(N), where N is the total number of elements (keys, values, or list items) in the input object.
-             - Primitive types: O(k), where k is the length of the string or number of digits.
-             - List: O(n * t), where n is the number of elements and t is the average time to serialize each element.
-             - Dictionary: O(m * t), where m is the number of key-value pairs and t is the average time to serialize each pair.
-
- 
- 
-
-    Space Complexity:
-          Overall: O(S + d), where S is the size of the serialized JSON string, and d is the depth of nested objects.
-               - Primitive types: O(k), where k is the size of the serialized result.
-               - List/Dictionary: O(d) for stack recursion and O(S) for output size.
-               - For a dictionary or list: O(n), where n is the number of elements in the object.
-               - For strings or numbers: O(1).
-    """
-    # Check if the object is a dictionary
-    if isinstance(obj, dict):
-        # Handle dictionaries
-        items = []  # List to hold serialized key-value pairs
-        for key, value in obj.items():
-            serialized_key = custom_dumps(key, indent)  # Serialize the key (must be string-like)
-            serialized_value = custom_dumps(value, indent, level + 1)  # Serialize the value
-            items.append(f"{serialized_key}: {serialized_value}")  # Add to the list
-        # Time Complexity: O(n), iterating over n items in the dictionary.
-        # Space Complexity: O(n) for the list of serialized items.
-
-        # Format output based on indentation
-        if indent is not None:
-            spacing = " " * (level * indent)  # Current level's spaces
-            inner_spacing = " " * ((level + 1) * indent)  # Inner level's spaces
-            return f"{{\n{inner_spacing}" + f",\n{inner_spacing}".join(items) + f"\n{spacing}}}"
-        return "{" + ", ".join(items) + "}"  # Compact representation
-        # Space Complexity: O(d) stack and O(n) for serialized result.
-
-    # Check if the object is a list
-    elif isinstance(obj, list):
-        # Handle lists
-        items = [custom_dumps(item, indent, level + 1) for item in obj]  # Recursively serialize list items
-        # Time Complexity: O(n), where n is the number of items in the list.
-        # Space Complexity: O(n) for the serialized items list.
-
-        # Format output based on indentation
-        if indent is not None:
-            spacing = " " * (level * indent)  # Current level's spaces
-            inner_spacing = " " * ((level + 1) * indent)  # Inner level's spaces
-            return f"[\n{inner_spacing}" + f",\n{inner_spacing}".join(items) + f"\n{spacing}]"
-        return "[" + ", ".join(items) + "]"  # Compact representation
-        # Space Complexity: O(d) stack and O(n) for serialized result.
-
-    # Check if the object is a string
-    elif isinstance(obj, str):
-        # Handle strings
-        return f'"{obj}"'  # Wrap the string in double quotes
-        # Time Complexity: O(k), where k is the length of the string.
-        # Space Complexity: O(k) for the result string.
-
-    # Check if the object is a number (int or float)
-    elif isinstance(obj, (int, float)):
-        # Handle numbers
-        return str(obj)  # Convert number to a string
-        # Time Complexity: O(k), where k is the number of digits in the number.
-        # Space Complexity: O(k) for the result string.
-
-    # Check if the object is a boolean
-    elif obj is True:
-        return "true"  # Convert Python True to JSON true
-        # Time Complexity: O(1).
-        # Space Complexity: O(1).
-    elif obj is False:
-        return "false"  # Convert Python False to JSON false
-        # Time Complexity: O(1).
-        # Space Complexity: O(1).
-
-    # Check if the object is None
-    elif obj is None:
-        return "null"  # Convert Python None to JSON null
-        # Time Complexity: O(1).
-        # Space Complexity: O(1).
-
-    # If the object is not JSON-serializable
-    else:
-        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
-        # Time Complexity: O(1).
-        # Space Complexity: O(1).
+    Time Complexity: O(S), where S is the size of the serialized JSON string.
+    Space Complexity: O(S) for the result string.
+    """
+    out = io.StringIO()
+    custom_dump(obj, out, indent, level)
+    return out.getvalue()
@@ -10,7 +10,7 @@ from PyQt5.QtWidgets import (
 
 from PyQt5.QtGui import QFont, QIcon
 from PyQt5.QtCore import Qt
-from CONSISTENCY import fix_xml_consistency, check_xml_consistency
+from CONSISTENCY import fix_xml_consistency, IncrementalChecker
 from CONVERT_TO_JSON import xml_to_json
 from MINIFYING import minify_xml
 from COMPRESSION import compress_xml_content  # Import the compress_xml function from the updated compression file
@@ -21,6 +21,23 @@ from POST_SEARCH import *
 
 
 
+class DocumentLines:
+    """The lines of a QTextDocument as a read-only sequence, without copying the whole text."""
+
+    def __init__(self, document):
+        self.document = document
+
+    def __len__(self):
+        return self.document.blockCount()
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("line index out of range")
+        return self.document.findBlockByNumber(index).text()
+
+
 class XMLApp(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -83,6 +100,15 @@ class XMLApp(QMainWindow):
         self.input_text = QTextEdit()
         self.layout.addWidget(self.input_text)
 
+        # Live consistency status, re-checked from the nearest checkpoint on every edit
+        self.consistency_status = QLabel()
+        self.layout.addWidget(self.consistency_status)
+        self.consistency_checker = IncrementalChecker()
+        self.consistency_checker.reset(DocumentLines(self.input_text.document()))
+        self.line_count = self.input_text.document().blockCount()
+        self.input_text.document().contentsChange.connect(self.revalidate_edit)
+        self.show_consistency_status()
+
         # Buttons Layout
         self.button_layout_1 = QHBoxLayout()
         self.button_layout_2 = QHBoxLayout()
@@ -185,12 +211,34 @@ class XMLApp(QMainWindow):
             with open(file_name, "w", encoding="utf-8") as file:
                 file.write(self.output_text.toPlainText())
 
+    def revalidate_edit(self, position, chars_removed, chars_added):
+        """Re-check the lines an edit touched (see IncrementalChecker) and update the status line."""
+        document = self.input_text.document()
+        first = document.findBlock(position).blockNumber()
+        last = document.findBlock(position + chars_added).blockNumber()
+        if first == -1 or last == -1:
+            # The change reaches past the last block (e.g. the whole text was replaced)
+            last = document.blockCount() - 1
+            first = min(max(first, 0), last)
+        line_count = document.blockCount()
+        self.consistency_checker.edit(DocumentLines(document), first, max(first, last), line_count - self.line_count)
+        self.line_count = line_count
+        self.show_consistency_status()
+
+    def show_consistency_status(self):
+        is_valid, errors = self.consistency_checker.result()
+        if is_valid:
+            self.consistency_status.setText("Consistency: valid")
+        else:
+            line, msg = errors[0]
+            self.consistency_status.setText(f"Consistency: {len(errors)} errors (line {line}: {msg})")
+
     def check_consistency(self):
         self.clear_graph_display()  
         self.output_text.clear()
-        input_xml = self.input_text.toPlainText().splitlines()
-        if input_xml:
-            is_valid, errors = check_xml_consistency(input_xml)
+        if not self.input_text.document().isEmpty():
+            # Kept up to date on every edit by revalidate_edit
+            is_valid, errors = self.consistency_checker.result()
             if is_valid:
                 self.clear_graph_display()
                 QMessageBox.information(self, "Consistency Check", "The XML file is valid and consistent.")
@@ -203,11 +251,12 @@ class XMLApp(QMainWindow):
     def fix_consistency(self):
         self.clear_graph_display()
         self.output_text.clear()
-        input_xml = self.input_text.toPlainText().splitlines()
-        if input_xml:
-            is_valid, errors = check_xml_consistency(input_xml)
+        document = self.input_text.document()
+        if not document.isEmpty():
+            # Kept up to date on every edit by revalidate_edit; the fixes read the lines straight from the document
+            is_valid, errors = self.consistency_checker.result()
             if not is_valid:
-                fixed_lines, error_log = fix_xml_consistency(input_xml, errors)
+                fixed_lines, error_log = fix_xml_consistency(DocumentLines(document), errors)
                 self.output_text.setText("\n".join(fixed_lines))
                 self.clear_graph_display()
                 QMessageBox.information(self, "Fix Consistency", "The errors have been fixed and displayed in the output.")
@@ -0,0 +1,309 @@
+'''
+Compression benchmark suite.
+
+Generates synthetic social-network XML with the schema of s.xml (users with an id, a name, posts
+with a body and topics, and followers), then compresses and decompresses it with the .comp codecs
+and with the standard library's zlib and lzma as baselines. The text method times the string-level
+byte_pair_encoding and reverse_bpe functions directly. Every run reports the compression ratio,
+the throughput in MB/s and the peak resident memory of each step, and is saved as a JSON file so
+that runs can be compared over time.
+
+Every step runs in its own Python process, so its peak RSS is its own and not that of the suite.
+Where the resource module is missing (Windows), the peak is the tracemalloc peak of Python
+allocations instead, which also slows the step down; the report records which one was used.
+
+Usage:
+    python benchmark.py                                # 1 MB input, every method
+    python benchmark.py --sizes 1MB,100MB,1GB          # the full suite
+    python benchmark.py --methods bpe,zlib --output results.json
+'''
+
+import argparse
+import hashlib
+import json
+import lzma
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+import zlib
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from codec_registry import get_codec
+from compress import byte_pair_encoding, compress_xml_stream
+from decompress import decompress_xml, reverse_bpe
+
+SIZES = {
+    "1MB": 1 << 20,
+    "100MB": 100 << 20,
+    "1GB": 1 << 30,
+}
+
+# .comp codecs (run through compress_xml_stream / decompress_xml), the string-level BPE functions
+# (byte_pair_encoding / reverse_bpe on the whole text) and stdlib baselines
+COMP_METHODS = ("bpe", "huffman", "lz77")
+TEXT_METHOD = "text"
+BASELINE_METHODS = ("zlib", "lzma")
+METHODS = COMP_METHODS + (TEXT_METHOD,) + BASELINE_METHODS
+
+# Separates the text method's encoded string from its JSON mapping
+TEXT_MAP_DELIMITER = "\n===JSON_MAP===\n"
+
+CHUNK_SIZE = 1 << 20
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore et "
+    "dolore magna aliqua enim ad minim veniam quis nostrud exercitation ullamco laboris nisi aliquip ex ea "
+    "commodo consequat"
+).split()
+FIRST_NAMES = ("Ahmed", "Mohamed", "Sara", "Omar", "Mona", "Youssef", "Nour", "Hana", "Karim", "Laila")
+LAST_NAMES = ("Ali", "Hassan", "Ibrahim", "Mahmoud", "Said", "Farouk", "Nabil", "Adel", "Samir", "Tarek")
+TOPICS = ("economy", "finance", "solar_energy", "sports", "education", "health", "technology", "politics")
+
+
+def generate_user(rng, user_id, user_count):
+    """Return one <user> record, indented like s.xml."""
+    lines = [
+        "    <user>",
+        f"        <id>{user_id}</id>",
+        f"        <name>{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}</name>",
+        "        <posts>",
+    ]
+    for _ in range(rng.randint(1, 4)):
+        body = " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 40)))
+        lines += [
+            "            <post>",
+            "                <body>",
+            f"                    {body[0].upper()}{body[1:]}.",
+            "                </body>",
+            "                <topics>",
+        ]
+        for topic in rng.sample(TOPICS, rng.randint(1, 3)):
+            lines += [
+                "                    <topic>",
+                f"                        {topic}",
+                "                    </topic>",
+            ]
+        lines += [
+            "                </topics>",
+            "            </post>",
+        ]
+    lines.append("        </posts>")
+    lines.append("        <followers>")
+    for follower in rng.sample(range(1, user_count + 1), min(rng.randint(1, 8), user_count)):
+        lines += [
+            "            <follower>",
+            f"                <id>{follower}</id>",
+            "            </follower>",
+        ]
+    lines += [
+        "        </followers>",
+        "    </user>",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def generate_social_network(path, size, seed=0):
+    """
+    Write a well-formed synthetic social network of about `size` bytes (never less) to `path`.
+
+    The file is written user by user, so memory use does not depend on `size`. The same seed and
+    size always give the same file.
+    """
+    rng = random.Random(seed)
+    # About 1.2 KB per user; follower ids point at users that exist
+    user_count = max(size // 1200, 1)
+    written = 0
+    with open(path, 'w', encoding='utf-8', newline='\n') as file:
+        written += file.write("<users>\n")
+        user_id = 1
+        while written < size - len("</users>\n"):
+            written += file.write(generate_user(rng, user_id, user_count))
+            user_id += 1
+        file.write("</users>\n")
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _baseline_compressor(method):
+    if method == "zlib":
+        return zlib.compressobj(9)
+    return lzma.LZMACompressor(preset=6)
+
+
+def _baseline_decompressor(method):
+    if method == "zlib":
+        return zlib.decompressobj()
+    return lzma.LZMADecompressor()
+
+
+def _run_text_step(operation, input_file, output_file):
+    """Encode a file with byte_pair_encoding, or decode it with reverse_bpe."""
+    with open(input_file, 'r', encoding='utf-8', newline='') as source:
+        content = source.read()
+    if operation == "compress":
+        encoded, mapping = byte_pair_encoding(content)
+        result = encoded + TEXT_MAP_DELIMITER + json.dumps(mapping)
+    else:
+        encoded, _, mapping_json = content.rpartition(TEXT_MAP_DELIMITER)
+        result = reverse_bpe(encoded, json.loads(mapping_json))
+    with open(output_file, 'w', encoding='utf-8', newline='') as out:
+        out.write(result)
+
+
+def run_step(method, operation, input_file, output_file):
+    """
+    Run one compression or decompression step in this process and return its measurements.
+
+    Returns:
+    --------
+    dict
+        seconds and peak_rss_kb of the step.
+    """
+    if resource is None:
+        tracemalloc.start()
+    started = time.perf_counter()
+    if method in COMP_METHODS:
+        if operation == "compress":
+            compress_xml_stream(input_file, output_file, codec=get_codec(method))
+        else:
+            decompress_xml(input_file, output_file)
+    elif method == TEXT_METHOD:
+        _run_text_step(operation, input_file, output_file)
+    else:
+        worker = _baseline_compressor(method) if operation == "compress" else _baseline_decompressor(method)
+        process = worker.compress if operation == "compress" else worker.decompress
+        with open(input_file, 'rb') as source, open(output_file, 'wb') as out:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                out.write(process(chunk))
+            if operation == "compress":
+                out.write(worker.flush())
+    seconds = time.perf_counter() - started
+    if resource is None:
+        peak = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    else:
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            peak //= 1024
+    return {"seconds": seconds, "peak_rss_kb": peak}
+
+
+def measure(method, operation, input_file, output_file):
+    """Run one step in a fresh Python process (see run_step) and return its measurements."""
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--step", method, operation, input_file, output_file],
+        capture_output=True, text=True, check=True,
+    )
+    # The last line is the measurement; anything before it is output of the step itself
+    lines = completed.stdout.strip().splitlines()
+    if not lines or "Error" in completed.stdout:
+        raise RuntimeError(f"{method} {operation} failed: {completed.stdout.strip()}")
+    return json.loads(lines[-1])
+
+
+def benchmark(size_name, method, workdir, seed=0):
+    """
+    Compress and decompress one generated input with one method.
+
+    Returns:
+    --------
+    dict
+        One result row of the JSON report.
+    """
+    input_file = os.path.join(workdir, f"social_{size_name}_{seed}.xml")
+    if not os.path.exists(input_file):
+        print(f"Generating {input_file} ...")
+        generate_social_network(input_file, SIZES[size_name], seed)
+    compressed_file = os.path.join(workdir, f"social_{size_name}.{method}")
+    restored_file = os.path.join(workdir, f"social_{size_name}.{method}.xml")
+
+    input_bytes = os.path.getsize(input_file)
+    compressed = measure(method, "compress", input_file, compressed_file)
+    decompressed = measure(method, "decompress", compressed_file, restored_file)
+    compressed_bytes = os.path.getsize(compressed_file)
+    megabytes = input_bytes / (1 << 20)
+
+    row = {
+        "size": size_name,
+        "method": method,
+        "input_bytes": input_bytes,
+        "compressed_bytes": compressed_bytes,
+        "ratio": input_bytes / compressed_bytes if compressed_bytes else 0.0,
+        "compress_seconds": compressed["seconds"],
+        "compress_mb_s": megabytes / compressed["seconds"],
+        "compress_peak_rss_kb": compressed["peak_rss_kb"],
+        "decompress_seconds": decompressed["seconds"],
+        "decompress_mb_s": megabytes / decompressed["seconds"],
+        "decompress_peak_rss_kb": decompressed["peak_rss_kb"],
+        "round_trip_ok": file_digest(input_file) == file_digest(restored_file),
+    }
+    os.remove(compressed_file)
+    os.remove(restored_file)
+    return row
+
+
+def print_row(row):
+    print(f"{row['size']:>6} {row['method']:<8} ratio {row['ratio']:7.2f}  "
+          f"compress {row['compress_mb_s']:8.2f} MB/s {row['compress_peak_rss_kb'] / 1024:7.1f} MB  "
+          f"decompress {row['decompress_mb_s']:8.2f} MB/s {row['decompress_peak_rss_kb'] / 1024:7.1f} MB  "
+          f"{'ok' if row['round_trip_ok'] else 'MISMATCH'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark .comp compression against zlib and lzma.")
+    parser.add_argument("--sizes", default="1MB", help=f"Comma-separated input sizes out of {', '.join(SIZES)} (default: 1MB).")
+    parser.add_argument("--methods", default=",".join(METHODS), help=f"Comma-separated methods out of {', '.join(METHODS)}.")
+    parser.add_argument("--workdir", default="benchmark_data", help="Directory for the generated inputs (kept between runs).")
+    parser.add_argument("--output", help="JSON report path (default: benchmark-<timestamp>.json).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the input generator.")
+    parser.add_argument("--step", nargs=4, metavar=("METHOD", "OPERATION", "INPUT", "OUTPUT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.step:
+        print(json.dumps(run_step(*args.step)))
+        return
+
+    sizes = args.sizes.split(",")
+    methods = args.methods.split(",")
+    unknown = [size for size in sizes if size not in SIZES] + [method for method in methods if method not in METHODS]
+    if unknown:
+        parser.error(f"unknown size or method: {', '.join(unknown)}")
+
+    os.makedirs(args.workdir, exist_ok=True)
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "peak_memory": "ru_maxrss" if resource is not None else "tracemalloc",
+        "results": [],
+    }
+    for size_name in sizes:
+        for method in methods:
+            row = benchmark(size_name, method, args.workdir, args.seed)
+            print_row(row)
+            report["results"].append(row)
+
+    output = args.output or f"benchmark-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+'''
+Ordered, bounded parallel map used to spread .comp blocks over several processes.
+'''
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+def ordered_map(function, items, jobs, initializer=None, initargs=()):
+    """
+    Apply `function` to every item in a pool of `jobs` processes and yield the results in input order.
+
+    At most 2 * jobs items are in flight at any time, so a lazy `items` iterator (for example blocks read
+    from a file) is never read far ahead of the consumer and memory stays proportional to the block size.
+    With jobs <= 1 everything runs in the calling process.
+
+    Parameters:
+    -----------
+    function : callable
+        A module-level function (it has to be picklable) taking one item.
+    items : iterable
+        The work items.
+    jobs : int
+        Number of worker processes.
+    initializer, initargs :
+        Called once in every worker (and once in-process when jobs <= 1) to set up shared state,
+        such as the merge table, without sending it along with every item.
+
+    Yields:
+    -------
+    The results of `function`, in the order of `items`.
+    """
+    if jobs <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for item in items:
+            yield function(item)
+        return
+
+    window = 2 * jobs
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=initializer, initargs=initargs) as executor:
+        for item in items:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
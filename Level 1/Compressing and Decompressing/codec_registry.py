@@ -0,0 +1,169 @@
+'''
+Block codecs for .comp containers, and sample-based selection between them.
+
+All codecs share the interface described on compress.BpeCodec, so compress_xml_stream,
+decompress_xml and the block-parallel pool work the same whatever codec wrote the blocks:
+
+    bpe      Byte Pair Encoding with a per-file merge table (compress.BpeCodec).
+    huffman  The same, with the symbol stream Huffman-coded (see huffman.py).
+    zlib     DEFLATE, via the standard library's zlib.
+    lz77     LZMA2 (an LZ77 coder with a range-coded back end), via the standard library's lzma.
+
+The dictionary coders win on markup and on long runs of repeated text such as post bodies, while
+zlib and lzma are much faster and do well on id-heavy lists, so no single codec is best for every
+file. choose_codec compresses a few blocks sampled across the file with every codec and picks the
+best trade-off between ratio and encoding time for that file.
+'''
+
+import lzma
+import os
+import time
+import zlib
+
+from comp_format import CODEC_BPE, CODEC_LZ77, CODEC_ZLIB, encode_merge_table
+from compress import BpeCodec
+
+ZLIB_LEVEL = 9
+LZMA_FILTERS = [{"id": lzma.FILTER_LZMA2, "preset": 6}]
+
+# Bytes sampled by choose_codec, spread over AUTO_SAMPLE_COUNT evenly spaced blocks
+AUTO_SAMPLE_SIZE = 256 << 10
+AUTO_SAMPLE_COUNT = 4
+
+# How much encoding time counts against ratio in choose_codec:
+# 0 picks the best ratio whatever it costs, 1 picks the best ratio per second.
+AUTO_TIME_WEIGHT = 0.2
+
+
+class ZlibCodec:
+    """DEFLATE on every block; no per-file state."""
+
+    name = "zlib"
+    codec_id = CODEC_ZLIB
+    huffman = False
+
+    def learn(self, block):
+        return [], self.encode(block, [])
+
+    def encode(self, block, merges):
+        return zlib.compress(block, ZLIB_LEVEL)
+
+    def decoder(self, merges):
+        return zlib.decompress
+
+
+class Lz77Codec:
+    """Raw LZMA2 stream on every block; no per-file state."""
+
+    name = "lz77"
+    codec_id = CODEC_LZ77
+    huffman = False
+
+    def learn(self, block):
+        return [], self.encode(block, [])
+
+    def encode(self, block, merges):
+        return lzma.compress(block, format=lzma.FORMAT_RAW, filters=LZMA_FILTERS)
+
+    def decoder(self, merges):
+        return _decode_lzma
+
+
+def _decode_lzma(payload):
+    return lzma.decompress(payload, format=lzma.FORMAT_RAW, filters=LZMA_FILTERS)
+
+
+CODECS = {
+    "bpe": BpeCodec(),
+    "huffman": BpeCodec(huffman=True),
+    "zlib": ZlibCodec(),
+    "lz77": Lz77Codec(),
+}
+
+
+def get_codec(name):
+    """
+    Look up a codec by name.
+
+    Raises:
+    -------
+    ValueError
+        If no codec has that name.
+    """
+    if name not in CODECS:
+        raise ValueError(f"Unknown codec '{name}'. Choose one of: {', '.join(CODECS)}.")
+    return CODECS[name]
+
+
+def codec_for_container(reader):
+    """
+    Return the codec that wrote the blocks of an open ContainerReader.
+
+    Raises:
+    -------
+    ValueError
+        If the container names a codec this version does not know.
+    """
+    if reader.codec_id == CODEC_BPE:
+        return CODECS["huffman" if reader.huffman else "bpe"]
+    for codec in CODECS.values():
+        if codec.codec_id == reader.codec_id:
+            return codec
+    raise ValueError(f"Unsupported codec id {reader.codec_id} in .comp file.")
+
+
+def sample_file(input_file, sample_size=AUTO_SAMPLE_SIZE, count=AUTO_SAMPLE_COUNT):
+    """
+    Read `count` evenly spaced pieces of a file, `sample_size` bytes in total.
+
+    Small files are returned whole.
+    """
+    size = os.path.getsize(input_file)
+    with open(input_file, 'rb') as file:
+        if size <= sample_size:
+            return file.read()
+        piece = sample_size // count
+        step = (size - piece) // max(count - 1, 1)
+        parts = []
+        for number in range(count):
+            file.seek(number * step)
+            parts.append(file.read(piece))
+    return b''.join(parts)
+
+
+def choose_codec(input_file, time_weight=AUTO_TIME_WEIGHT, names=None):
+    """
+    Pick the codec with the best ratio-to-time trade-off for one file.
+
+    A sample of the file (see sample_file) is compressed with every candidate, counting the merge
+    table of the BPE codecs as part of the output. Each codec scores ratio / seconds ** time_weight
+    and the highest score wins.
+
+    Parameters:
+    -----------
+    input_file : str
+        Path to the file that is about to be compressed.
+    time_weight : float
+        0 picks the best ratio whatever it costs, 1 picks the best ratio per second of encoding.
+    names : list of str, optional
+        Candidate codec names (default: every registered codec).
+
+    Returns:
+    --------
+    tuple : (object, list)
+        - The chosen codec.
+        - One (name, ratio, seconds, score) tuple per candidate, for reporting.
+    """
+    sample = sample_file(input_file)
+    results = []
+    for name in names or CODECS:
+        codec = get_codec(name)
+        started = time.perf_counter()
+        merges, payload = codec.learn(sample)
+        seconds = max(time.perf_counter() - started, 1e-6)
+        size = len(payload) + len(encode_merge_table(merges))
+        ratio = len(sample) / size if sample else 1.0
+        results.append((name, ratio, seconds, ratio / seconds ** time_weight))
+
+    best = max(results, key=lambda result: result[3])
+    return get_codec(best[0]), results
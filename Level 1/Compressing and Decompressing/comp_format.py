@@ -0,0 +1,483 @@
+'''
+Binary layout of the .comp container shared by compress.py and decompress.py.
+
+Layout (format version 2):
+
+    offset  size  field
+    ------  ----  -----------------------------------------------
+         0     4  magic  b"XBPE"
+         4     1  format version (2)
+         5     1  flags (FLAG_INDEX when a block index follows the blocks,
+                        FLAG_EXTERNAL_DICTIONARY when the merge table lives in a separate dictionary file,
+                        FLAG_HUFFMAN when the symbol streams are Huffman-coded)
+         6     2  codec of the block payloads (CODEC_BPE, CODEC_ZLIB or CODEC_LZ77, see codec_registry.py)
+         8     8  original size in bytes
+        16     4  number of merges
+        20     4  block size used by the compressor
+        24     8  number of blocks
+        32     8  size of the merge table in bytes
+        40        merge table: 2 varints (left, right) per merge, merge n creates symbol 256 + n
+                  (empty for codecs other than CODEC_BPE)
+                  (with FLAG_EXTERNAL_DICTIONARY: 4 bytes, the dictionary id of the table instead)
+                  blocks, one after the other (CODEC_ZLIB and CODEC_LZ77 payloads are the zlib stream or
+                  the raw LZMA2 stream of the block; CODEC_BPE payloads are described here):
+                      4  raw (uncompressed) length of the block
+                      4  payload length
+                         payload: varint symbol count, varint alphabet size,
+                                  alphabet (one varint per symbol, most frequent first),
+                                  symbol stream (one varint per symbol, its rank in the alphabet)
+                                  with FLAG_HUFFMAN the symbol stream is instead: one byte per alphabet
+                                  entry with its code length, then the canonical Huffman code of every
+                                  rank, most significant bit first (see huffman.py)
+                  block index (varints):
+                      block count, then per block: distance from the previous block's file offset, raw length
+                      user count, then per <user> record: id length, id (UTF-8), distance from the previous
+                      record's raw start, record length
+                  footer: 8 bytes file offset of the block index, magic b"XIDX"
+
+Every block carries its own alphabet, so a block can be decoded with nothing but the merge table,
+and the block index lets a reader seek straight to the blocks covering a byte range or a user.
+
+A dictionary file (written by train_dictionary) holds a merge table shared by many containers:
+
+         0     4  magic  b"XDCT"
+         4     1  format version (1)
+         5     4  number of merges
+         9        merge table, same encoding as above
+
+Its dictionary id is the CRC-32 of the encoded merge table.
+
+Bytes of the original data are symbols 0..255. Storing ranks instead of symbol ids means the
+128 most frequent symbols of a block take a single byte each, whatever their id is.
+All fixed-size integers are little-endian.
+'''
+
+import struct
+import zlib
+from bisect import bisect_left, bisect_right
+from collections import Counter
+
+from huffman import code_lengths, decode_symbols, encode_symbols
+
+MAGIC = b"XBPE"
+FORMAT_VERSION = 2
+FIRST_MERGE_SYMBOL = 256
+
+HEADER = struct.Struct("<4sBBHQIIQQ")
+BLOCK_HEADER = struct.Struct("<II")
+
+FLAG_INDEX = 1
+FLAG_EXTERNAL_DICTIONARY = 2
+FLAG_HUFFMAN = 4
+
+CODEC_BPE = 0
+CODEC_ZLIB = 1
+CODEC_LZ77 = 2
+INDEX_MAGIC = b"XIDX"
+FOOTER = struct.Struct("<Q4s")
+
+DICTIONARY_MAGIC = b"XDCT"
+DICTIONARY_VERSION = 1
+DICTIONARY_HEADER = struct.Struct("<4sBI")
+DICTIONARY_ID = struct.Struct("<I")
+
+
+def encode_varints(values, out=None):
+    """
+    Append each non-negative integer of `values` to `out` as a LEB128 varint.
+
+    Values below 128 take one byte, values below 16384 take two, and so on.
+
+    Parameters:
+    -----------
+    values : iterable of int
+        The integers to encode.
+    out : bytearray, optional
+        Buffer to append to. A new one is created when omitted.
+
+    Returns:
+    --------
+    bytearray
+        The buffer the varints were appended to.
+    """
+    if out is None:
+        out = bytearray()
+    append = out.append
+    for value in values:
+        while value >= 0x80:
+            append((value & 0x7F) | 0x80)
+            value >>= 7
+        append(value)
+    return out
+
+
+def decode_varints(buffer, offset, count):
+    """
+    Read `count` varints from `buffer` starting at `offset`.
+
+    `buffer` can be anything indexable by integer that yields ints: bytes, bytearray, memoryview or mmap.
+
+    Returns:
+    --------
+    tuple : (list, int)
+        - The decoded integers.
+        - The offset just past the last varint.
+    """
+    values = []
+    append = values.append
+    for _ in range(count):
+        byte = buffer[offset]
+        offset += 1
+        if byte < 0x80:
+            append(byte)
+            continue
+        value = byte & 0x7F
+        shift = 7
+        while True:
+            byte = buffer[offset]
+            offset += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        append(value)
+    return values, offset
+
+
+def encode_block_payload(symbols, huffman=False):
+    """
+    Encode one block of symbols: counts, the block's alphabet and the ranks of the symbols.
+
+    With huffman=True the ranks are Huffman-coded: the code length of every alphabet entry
+    (one byte each) is followed by the bit stream.
+
+    Returns:
+    --------
+    bytearray
+        The block payload.
+    """
+    frequencies = Counter(symbols)
+    alphabet = [symbol for symbol, _ in frequencies.most_common()]
+    rank = {symbol: index for index, symbol in enumerate(alphabet)}
+
+    payload = encode_varints((len(symbols), len(alphabet)))
+    encode_varints(alphabet, payload)
+    if huffman:
+        lengths = code_lengths([frequencies[symbol] for symbol in alphabet]) if alphabet else []
+        payload += bytes(lengths)
+        payload += encode_symbols(map(rank.__getitem__, symbols), lengths)
+    else:
+        encode_varints(map(rank.__getitem__, symbols), payload)
+    return payload
+
+
+def decode_block_payload(payload, huffman=False):
+    """
+    Decode a block payload written by encode_block_payload (with the same `huffman` setting).
+
+    Returns:
+    --------
+    tuple : (list, list)
+        - The block's alphabet: symbol ids, most frequent first.
+        - The symbol stream as ranks into the alphabet.
+    """
+    (symbol_count, alphabet_size), offset = decode_varints(payload, 0, 2)
+    alphabet, offset = decode_varints(payload, offset, alphabet_size)
+    if huffman:
+        lengths = list(payload[offset:offset + alphabet_size])
+        ranks = decode_symbols(payload[offset + alphabet_size:], lengths, symbol_count)
+    else:
+        ranks, offset = decode_varints(payload, offset, symbol_count)
+    return alphabet, ranks
+
+
+def expansion_table(merges):
+    """
+    Build the byte expansion of every symbol of a binary merge table.
+
+    Symbols 0..255 are single bytes and merge n expands to the expansions of its two halves,
+    which were both computed earlier, so every entry costs one concatenation.
+
+    Returns:
+    --------
+    list
+        Symbol id -> bytes it stands for.
+    """
+    table = [bytes((byte,)) for byte in range(FIRST_MERGE_SYMBOL)]
+    for first, second in merges:
+        table.append(table[first] + table[second])
+    return table
+
+
+def decode_block(payload, table, huffman=False):
+    """
+    Decode one block payload into the original bytes, given the expansion table of the merge table.
+    """
+    alphabet, ranks = decode_block_payload(payload, huffman)
+    by_rank = [table[symbol] for symbol in alphabet]
+    return b''.join(map(by_rank.__getitem__, ranks))
+
+
+def encode_merge_table(merges):
+    """Encode a merge table as 2 varints per merge."""
+    table = bytearray()
+    for first, second in merges:
+        encode_varints((first, second), table)
+    return table
+
+
+def dictionary_id(merges):
+    """Return the id (CRC-32 of the encoded table) that ties containers to their dictionary."""
+    return zlib.crc32(encode_merge_table(merges))
+
+
+def write_dictionary(file, merges):
+    """Write a merge table to an open binary file as a shared dictionary."""
+    file.write(DICTIONARY_HEADER.pack(DICTIONARY_MAGIC, DICTIONARY_VERSION, len(merges)))
+    file.write(encode_merge_table(merges))
+
+
+def read_dictionary(file):
+    """
+    Read a shared dictionary written by write_dictionary.
+
+    Returns:
+    --------
+    list
+        The merge table as a list of (left, right) pairs.
+
+    Raises:
+    -------
+    ValueError
+        If the file is not a dictionary.
+    """
+    header = file.read(DICTIONARY_HEADER.size)
+    if len(header) < DICTIONARY_HEADER.size or header[:len(DICTIONARY_MAGIC)] != DICTIONARY_MAGIC:
+        raise ValueError("Not a .comp dictionary (bad magic bytes).")
+    _, version, merge_count = DICTIONARY_HEADER.unpack(header)
+    if version != DICTIONARY_VERSION:
+        raise ValueError(f"Unsupported dictionary version {version}.")
+    flat, _ = decode_varints(file.read(), 0, 2 * merge_count)
+    return list(zip(flat[0::2], flat[1::2]))
+
+
+def load_dictionary(path):
+    """Read the shared dictionary stored at `path` and return its merge table."""
+    with open(path, 'rb') as file:
+        return read_dictionary(file)
+
+
+def is_container(buffer):
+    """Return True if `buffer` starts with the .comp magic bytes."""
+    return len(buffer) > len(MAGIC) and buffer[:len(MAGIC)] == MAGIC
+
+
+class ContainerWriter:
+    """
+    Writes a version 2 .comp container block by block.
+
+    The header is written with placeholder totals first and patched by close(), so the output
+    must be a seekable binary file. Only one block is ever held in memory.
+
+    write_block(raw_length, symbols): Appends one encoded block.
+    write_payload(raw_length, payload): Appends a block that was already encoded by encode_block_payload.
+    close(user_records): Writes the block index and patches the totals into the header.
+
+    With external_dictionary=True only the dictionary id of `merges` is stored, and the
+    container can only be decoded together with that dictionary file.
+    With huffman=True write_block Huffman-codes the symbols, and payloads given to write_payload
+    must have been encoded with encode_block_payload(symbols, huffman=True).
+    codec_id records which codec wrote the payloads; write_block is only meaningful for CODEC_BPE.
+    """
+
+    def __init__(self, file, merges, block_size, external_dictionary=False, huffman=False, codec_id=CODEC_BPE):
+        self.file = file
+        self.merges = merges
+        self.block_size = block_size
+        self.original_size = 0
+        self.block_count = 0
+        self.flags = FLAG_HUFFMAN if huffman else 0
+        self.huffman = huffman
+        self.codec_id = codec_id
+        self.block_entries = []  # (file offset, raw length) of every block
+
+        if external_dictionary:
+            merge_table = DICTIONARY_ID.pack(dictionary_id(merges))
+            self.flags |= FLAG_EXTERNAL_DICTIONARY
+        else:
+            merge_table = encode_merge_table(merges)
+        self.merge_table_size = len(merge_table)
+
+        self.start = file.tell()
+        file.write(self._header())
+        file.write(merge_table)
+
+    def _header(self):
+        return HEADER.pack(MAGIC, FORMAT_VERSION, self.flags, self.codec_id, self.original_size, len(self.merges),
+                           self.block_size, self.block_count, self.merge_table_size)
+
+    def write_block(self, raw_length, symbols):
+        self.write_payload(raw_length, encode_block_payload(symbols, self.huffman))
+
+    def write_payload(self, raw_length, payload):
+        self.block_entries.append((self.file.tell(), raw_length))
+        self.file.write(BLOCK_HEADER.pack(raw_length, len(payload)))
+        self.file.write(payload)
+        self.original_size += raw_length
+        self.block_count += 1
+
+    def close(self, user_records=()):
+        """
+        Finish the container.
+
+        user_records is an iterable of (user id, raw start, raw end) sorted by raw start; it is stored
+        in the block index so single users can be decoded without reading the rest of the file.
+        """
+        index = encode_varints([len(self.block_entries)])
+        previous = 0
+        for offset, raw_length in self.block_entries:
+            encode_varints((offset - previous, raw_length), index)
+            previous = offset
+
+        records = list(user_records)
+        encode_varints([len(records)], index)
+        previous = 0
+        for user_id, start, end in records:
+            name = user_id.encode('utf-8')
+            encode_varints([len(name)], index)
+            index += name
+            encode_varints((start - previous, end - start), index)
+            previous = start
+
+        index_offset = self.file.tell()
+        self.file.write(index)
+        self.file.write(FOOTER.pack(index_offset, INDEX_MAGIC))
+        self.flags |= FLAG_INDEX
+
+        end = self.file.tell()
+        self.file.seek(self.start)
+        self.file.write(self._header())
+        self.file.seek(end)
+
+
+class ContainerReader:
+    """
+    Reads a version 2 .comp container from a binary file object (a regular file or an mmap).
+
+    Blocks are read one at a time with read(), so decoding a container sequentially never holds
+    more than one block in memory.
+
+    merges: The merge table as a list of (left, right) pairs (None until attach_dictionary() for
+            containers that use an external dictionary).
+    huffman: Whether the block payloads are Huffman-coded.
+    codec_id: The codec of the block payloads.
+    attach_dictionary(merges): Supplies the merge table of an external dictionary.
+    blocks(): Yields (raw_length, payload) for every block in order.
+    read_index(): Loads the block index (block offsets, raw offsets and <user> records).
+    read_block(number): Returns (raw_length, payload) of one block, using the index.
+    blocks_in_range(start, end): Block numbers covering the raw bytes start..end.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        header = file.read(HEADER.size)
+        if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not a .comp container (bad magic bytes).")
+
+        (_, version, self.flags, self.codec_id, self.original_size, merge_count,
+         self.block_size, self.block_count, merge_table_size) = HEADER.unpack(header)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported .comp format version {version}.")
+
+        self.merge_count = merge_count
+        self.huffman = bool(self.flags & FLAG_HUFFMAN)
+        merge_table = file.read(merge_table_size)
+        if self.flags & FLAG_EXTERNAL_DICTIONARY:
+            (self.dictionary_id,) = DICTIONARY_ID.unpack(merge_table)
+            self.merges = None
+        else:
+            self.dictionary_id = None
+            flat, _ = decode_varints(merge_table, 0, 2 * merge_count)
+            self.merges = list(zip(flat[0::2], flat[1::2]))
+        self.blocks_start = file.tell()
+
+    def attach_dictionary(self, merges):
+        """
+        Use the merge table of an external dictionary.
+
+        Raises:
+        -------
+        ValueError
+            If the container does not use a dictionary or was written with a different one.
+        """
+        if self.dictionary_id is None:
+            raise ValueError("This .comp file does not use an external dictionary.")
+        if len(merges) != self.merge_count or dictionary_id(merges) != self.dictionary_id:
+            raise ValueError("The dictionary does not match the one this .comp file was compressed with.")
+        self.merges = merges
+
+    def _read_block_here(self):
+        raw_length, payload_length = BLOCK_HEADER.unpack(self.file.read(BLOCK_HEADER.size))
+        payload = self.file.read(payload_length)
+        if len(payload) != payload_length:
+            raise ValueError("Corrupted .comp file: truncated block.")
+        return raw_length, payload
+
+    def blocks(self):
+        self.file.seek(self.blocks_start)
+        for _ in range(self.block_count):
+            yield self._read_block_here()
+
+    def read_index(self):
+        """
+        Load the block index.
+
+        Sets block_offsets (file offset of every block), raw_offsets (raw start of every block, plus the
+        total size at the end) and users (user id -> (raw start, raw end)).
+
+        Raises:
+        -------
+        ValueError
+            If the container was written without an index.
+        """
+        if not self.flags & FLAG_INDEX:
+            raise ValueError("This .comp file has no block index.")
+
+        file = self.file
+        file.seek(-FOOTER.size, 2)
+        footer_offset = file.tell()
+        index_offset, magic = FOOTER.unpack(file.read(FOOTER.size))
+        if magic != INDEX_MAGIC:
+            raise ValueError("Corrupted .comp file: bad index footer.")
+        file.seek(index_offset)
+        index = file.read(footer_offset - index_offset)
+
+        (block_count,), offset = decode_varints(index, 0, 1)
+        flat, offset = decode_varints(index, offset, 2 * block_count)
+        self.block_offsets = []
+        self.raw_offsets = [0]
+        position = 0
+        for delta, raw_length in zip(flat[0::2], flat[1::2]):
+            position += delta
+            self.block_offsets.append(position)
+            self.raw_offsets.append(self.raw_offsets[-1] + raw_length)
+
+        (user_count,), offset = decode_varints(index, offset, 1)
+        self.users = {}
+        start = 0
+        for _ in range(user_count):
+            (length,), offset = decode_varints(index, offset, 1)
+            user_id = bytes(index[offset:offset + length]).decode('utf-8')
+            (delta, record_length), offset = decode_varints(index, offset + length, 2)
+            start += delta
+            self.users.setdefault(user_id, (start, start + record_length))
+
+    def read_block(self, number):
+        self.file.seek(self.block_offsets[number])
+        return self._read_block_here()
+
+    def blocks_in_range(self, start, end):
+        """Return the numbers of the blocks holding raw bytes start (inclusive) to end (exclusive)."""
+        first = max(0, bisect_right(self.raw_offsets, start) - 1)
+        last = bisect_left(self.raw_offsets, end)
+        return range(first, min(last, self.block_count))
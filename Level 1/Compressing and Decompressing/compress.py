@@ -3,23 +3,373 @@ AUTHOR: Mohamed Khaled Elsayed Goda
 ''' 
 
 import xml.etree.ElementTree as ET
-import json
-import sys
-from collections import Counter
+from xml.parsers import expat
+import heapq
+import os
+import re
+from array import array
+from collections import Counter, defaultdict
+from functools import partial
 
+from block_pool import ordered_map
+from comp_format import (
+    CODEC_BPE, FIRST_MERGE_SYMBOL, ContainerWriter, decode_block, encode_block_payload, expansion_table, write_dictionary,
+)
 
-def byte_pair_encoding(data):
+
+# Default limits for the merge loop. Every merge has to pay for its own dictionary entry,
+# so pairs that occur fewer than MIN_PAIR_FREQUENCY times are not worth replacing.
+MAX_MERGES = 4096
+MIN_PAIR_FREQUENCY = 4
+
+# Number of input bytes per block of the .comp container
+BLOCK_SIZE = 1 << 20
+
+# Number of corpus bytes a shared dictionary is trained on
+DICTIONARY_SAMPLE_SIZE = 4 << 20
+
+
+class PairMerger:
+    """
+    Incremental pair-count engine used by Byte Pair Encoding.
+
+    The symbols are kept in a doubly linked list (three parallel integer arrays) so a merge only
+    touches the positions where the merged pair actually occurs. Pair frequencies live in a
+    dictionary and are mirrored in a max-heap with lazy deletion, so the next most frequent pair
+    is found in O(log P) instead of recounting the whole sequence.
+
+    merge_most_frequent(new_symbol, min_frequency): Replaces every occurrence of the most frequent pair.
+    merge(pair, new_symbol): Replaces every occurrence of the given pair.
+    result(): Returns the remaining symbols in order.
+
+    Time Complexity:
+        - Building the index: O(n), where n is the number of input symbols.
+        - One merge: O(k log P), where k is the number of occurrences of the merged pair.
+        - Total: O(n log P) over all merges, since every merge removes k symbols for good.
+    """
+
+    def __init__(self, symbols):
+        self.symbols = array('i')
+        self.symbols.extend(symbols)  # also accepts bytes, which array() would read as raw machine ints
+        n = len(self.symbols)
+        self.next = array('i', range(1, n + 1))
+        self.prev = array('i', range(-1, n - 1))
+        if n:
+            self.next[-1] = -1
+
+        # pair -> number of live occurrences, pair -> left positions (may contain stale entries)
+        self.counts = Counter(zip(self.symbols, self.symbols[1:]))
+        self.positions = defaultdict(lambda: array('i'))
+        for i in range(n - 1):
+            self.positions[(self.symbols[i], self.symbols[i + 1])].append(i)
+
+        self.heap = [(-count, pair) for pair, count in self.counts.items()]
+        heapq.heapify(self.heap)
+
+    def most_frequent(self):
+        """Return (pair, count) for the most frequent live pair, or None if there is none."""
+        heap = self.heap
+        counts = self.counts
+        while heap:
+            negative_count, pair = heap[0]
+            if counts.get(pair, 0) == -negative_count:
+                return pair, -negative_count
+            heapq.heappop(heap)  # stale entry, a fresher one was pushed when the count changed
+        return None
+
+    def merge(self, pair, new_symbol):
+        """
+        Replace every non-overlapping occurrence of `pair` with `new_symbol`.
+
+        Returns the number of occurrences that were replaced.
+        """
+        first, second = pair
+        symbols, nxt, prv = self.symbols, self.next, self.prev
+        counts, positions = self.counts, self.positions
+        touched = set()
+        merged = 0
+
+        occurrences = positions.pop(pair, ())
+        if first == second:
+            # runs like "aaa" must be merged left to right
+            occurrences = sorted(occurrences)
+
+        for i in occurrences:
+            if symbols[i] != first:
+                continue
+            j = nxt[i]
+            if j == -1 or symbols[j] != second:
+                continue
+
+            left = prv[i]
+            right = nxt[j]
+
+            # The pairs around the occurrence disappear ...
+            if left != -1:
+                old = (symbols[left], first)
+                counts[old] -= 1
+                touched.add(old)
+            if right != -1:
+                old = (second, symbols[right])
+                counts[old] -= 1
+                touched.add(old)
+
+            # ... the two nodes collapse into one ...
+            symbols[i] = new_symbol
+            symbols[j] = -1
+            nxt[i] = right
+            if right != -1:
+                prv[right] = i
+            merged += 1
+
+            # ... and the new neighbouring pairs appear.
+            if left != -1:
+                new = (symbols[left], new_symbol)
+                counts[new] += 1
+                positions[new].append(left)
+                touched.add(new)
+            if right != -1:
+                new = (new_symbol, symbols[right])
+                counts[new] += 1
+                positions[new].append(i)
+                touched.add(new)
+
+        counts.pop(pair, None)
+        touched.discard(pair)
+        for other in touched:
+            count = counts.get(other, 0)
+            if count > 0:
+                heapq.heappush(self.heap, (-count, other))
+            else:
+                counts.pop(other, None)
+                positions.pop(other, None)
+        return merged
+
+    def merge_most_frequent(self, new_symbol, min_frequency=2):
+        """
+        Merge the most frequent pair into `new_symbol` if it occurs at least `min_frequency` times.
+
+        Returns the merged pair, or None if no pair is frequent enough.
+        """
+        best = self.most_frequent()
+        if best is None or best[1] < max(2, min_frequency):
+            return None
+        pair = best[0]
+        self.merge(pair, new_symbol)
+        return pair
+
+    def result(self):
+        """Return the current symbol sequence as a list of integers."""
+        symbols, nxt = self.symbols, self.next
+        output = []
+        i = 0 if len(symbols) else -1
+        while i != -1:
+            output.append(symbols[i])
+            i = nxt[i]
+        return output
+
+
+def learn_merges(symbols, first_symbol, max_merges=MAX_MERGES, min_frequency=MIN_PAIR_FREQUENCY):
+    """
+    Run Byte Pair Encoding over a sequence of integer symbols.
+
+    Parameters:
+    -----------
+    symbols : iterable of int
+        The input sequence.
+    first_symbol : int
+        The integer given to the first new symbol; merge n produces symbol first_symbol + n.
+    max_merges : int
+        Upper bound on the number of merges.
+    min_frequency : int
+        Pairs that occur fewer times than this are not merged.
+
+    Returns:
+    --------
+    tuple : (list, list)
+        - The encoded symbol sequence.
+        - The merge table, a list of (left, right) pairs in the order they were learned.
+    """
+    merger = PairMerger(symbols)
+    merges = []
+    while len(merges) < max_merges:
+        pair = merger.merge_most_frequent(first_symbol + len(merges), min_frequency)
+        if pair is None:
+            break
+        merges.append(pair)
+    return merger.result(), merges
+
+
+def apply_merges(symbols, merges, first_symbol=FIRST_MERGE_SYMBOL):
+    """
+    Encode a sequence of integer symbols with an existing merge table.
+
+    The merges are replayed in the order they were learned, each one replacing every occurrence
+    of its pair, so the result decodes with the same table. Merges whose pair does not occur cost
+    a single dictionary lookup.
+
+    Parameters:
+    -----------
+    symbols : iterable of int
+        The input sequence (bytes work directly).
+    merges : list of (int, int)
+        The merge table, merge n creates symbol first_symbol + n.
+
+    Returns:
+    --------
+    list
+        The encoded symbol sequence.
+    """
+    merger = PairMerger(symbols)
+    for n, pair in enumerate(merges):
+        if pair in merger.counts:
+            merger.merge(pair, first_symbol + n)
+    return merger.result()
+
+
+def symbol_lengths(merges, first_symbol=FIRST_MERGE_SYMBOL):
+    """Return a list giving the number of original bytes behind every symbol id."""
+    lengths = [1] * first_symbol
+    for first, second in merges:
+        lengths.append(lengths[first] + lengths[second])
+    return lengths
+
+
+def split_symbols(symbols, merges, block_size):
+    """
+    Cut an encoded symbol stream into consecutive blocks of roughly `block_size` original bytes.
+
+    Yields:
+    -------
+    tuple : (int, list)
+        The raw length of the block and its symbols.
+    """
+    lengths = symbol_lengths(merges)
+    start = 0
+    raw_length = 0
+    for index, symbol in enumerate(symbols):
+        raw_length += lengths[symbol]
+        if raw_length >= block_size:
+            yield raw_length, symbols[start:index + 1]
+            start = index + 1
+            raw_length = 0
+    if start < len(symbols):
+        yield raw_length, symbols[start:]
+
+
+class UserIndexer:
+    """
+    Finds the id and raw byte range of every <user> record while the input streams past in blocks.
+
+    A record runs from its <user> tag to the matching </user>, and its id is the text of the <id>
+    element directly inside it (the <id> tags of followers are one level deeper). Only an unfinished
+    tag or an unfinished <id> value is carried from one block to the next.
+
+    feed(block): Scans the next block of raw bytes.
+    records: List of (user id, raw start, raw end) in file order.
+    """
+
+    TAG = re.compile(rb"<(/?)([A-Za-z_][\w.:-]*)[^>]*?(/?)>")
+
+    def __init__(self):
+        self.records = []
+        self.carry = b""
+        self.carry_start = 0     # raw offset of carry[0]
+        self.depth = 0           # nesting depth inside the current <user>, 0 outside of records
+        self.user_start = None
+        self.user_id = None
+        self.id_start = None     # raw offset where the text of the record's <id> starts
+
+    def feed(self, block):
+        data = self.carry + block
+        base = self.carry_start
+        consumed = 0
+
+        for match in self.TAG.finditer(data):
+            closing, name, self_closing = match.groups()
+            consumed = match.end()
+            if self_closing:
+                continue
+
+            if not closing:
+                if self.depth == 0:
+                    if name == b"user":
+                        self.depth = 1
+                        self.user_start = base + match.start()
+                        self.user_id = None
+                    continue
+                self.depth += 1
+                if self.depth == 2 and name == b"id" and self.user_id is None:
+                    self.id_start = base + match.end()
+
+            elif self.depth > 0:
+                if self.depth == 2 and name == b"id" and self.id_start is not None:
+                    self.user_id = data[self.id_start - base:match.start()].decode('utf-8', 'replace').strip()
+                    self.id_start = None
+                self.depth -= 1
+                if self.depth == 0 and self.user_id is not None:
+                    self.records.append((self.user_id, self.user_start, base + match.end()))
+
+        # Keep the unfinished tail for the next block
+        keep = data.find(b"<", consumed)
+        if keep == -1:
+            keep = len(data)
+        if self.id_start is not None:
+            keep = min(keep, self.id_start - base)
+        self.carry = data[keep:]
+        self.carry_start = base + keep
+
+
+class WellFormednessCheck:
+    """
+    Streaming well-formedness check of raw XML bytes, using the expat parser without any handlers.
+
+    No tree is built, so the check costs one C-level scan of the input and constant memory.
+
+    feed(block): Scans the next block of raw bytes.
+    close(): Checks that the document is complete.
+    Both raise ValueError with expat's message (and line / column) at the first error.
+    """
+
+    def __init__(self):
+        self.parser = expat.ParserCreate()
+
+    def feed(self, block, final=False):
+        try:
+            self.parser.Parse(block, final)
+        except expat.ExpatError as e:
+            raise ValueError(f"The input is not well-formed XML: {e}") from None
+
+    def close(self):
+        self.feed(b"", True)
+
+
+def _observed_blocks(blocks, observers):
+    """Pass blocks through unchanged while feeding them to every observer (UserIndexer, WellFormednessCheck)."""
+    for block in blocks:
+        for observer in observers:
+            observer.feed(block)
+        yield block
+
+
+def byte_pair_encoding(data, max_merges=MAX_MERGES, min_frequency=MIN_PAIR_FREQUENCY):
 
     """
     Perform Byte Pair Encoding (BPE) on the input data.
 
     This function compresses a string by iteratively replacing the most frequent adjacent character pairs with a new character.
     It returns the compressed data and the mapping of replacements used during compression.
+    Pair counts are updated incrementally by `PairMerger`, so each merge costs time in proportion to the occurrences
+    it touches and hundreds or thousands of merges stay affordable on large inputs.
 
     Parameters:
     -----------
     data : str
         The input string to be compressed.
+    max_merges : int
+        Upper bound on the number of new characters introduced.
+    min_frequency : int
+        Stop once the most frequent pair occurs fewer times than this.
 
     Returns:
     --------
@@ -28,64 +378,66 @@ def byte_pair_encoding(data):
         - Dictionary mapping new characters to the replaced pairs.
     """
 
-    mapping = {}
-    step_count = 0
-    initial_size = len(data)
-    current_dict_size = 0
-    current_size = len(data)
-
-    def get_pairs(data):
-        pairs = Counter(zip(data, data[1:]))  # Generate pairs and count them
-        unique_pairs = len(pairs) == len(data) - 1  # Check if all pairs are unique
-        number_of_pairs = len(pairs)  # Total unique pairs
-        return pairs, unique_pairs, number_of_pairs
-    
-    for i in range(0,10):
-        pairs,unique_pairs,number_of_pairs = get_pairs(data)
-        step_count += 1
-        if not pairs or unique_pairs:
-            break
-        
-        most_frequent = max(pairs, key=pairs.get)
-        most_frequent_value = pairs[most_frequent]
+    if not data:
+        return data, {}
 
-        if(most_frequent_value < initial_size*1/100):
-            break
+    symbols = [ord(char) for char in data]
 
-        new_char = chr(len(mapping) + 256)
-        mapping[new_char] = most_frequent
-        data = data.replace(''.join(most_frequent), new_char)
+    # New characters must not collide with characters of the input and must stay out of the
+    # surrogate range, otherwise the result could not be written as UTF-8.
+    first_symbol = max(256, max(symbols) + 1)
+    if first_symbol < 0xE000 and first_symbol + max_merges > 0xD800:
+        first_symbol = 0xE000
+    max_merges = max(0, min(max_merges, 0x110000 - first_symbol))
 
-        if((current_size - len(data) - (sys.getsizeof(mapping) - current_dict_size)) < initial_size/100):
-            break
+    encoded, merges = learn_merges(symbols, first_symbol, max_merges, min_frequency)
 
-        else:
-            current_dict_size = sys.getsizeof(mapping)
-            current_size = len(data)
+    mapping = {}
+    for n, (first, second) in enumerate(merges):
+        mapping[chr(first_symbol + n)] = (chr(first), chr(second))
 
-    return data, mapping
+    return ''.join(map(chr, encoded)), mapping
 
 
-def compress_xml(input_file, output_file):
+def compress_xml(input_file, output_file, index_users=False, huffman=False, raw=False, check=False, block_size=BLOCK_SIZE):
 
     """
     Compress an XML file using a Byte Pair Encoding (BPE) technique.
 
-    This function reads an XML file, compresses its content using BPE, and saves the compressed data and the BPE mapping to the output file.
-    The output file will have two parts:
-      1. The compressed XML data.
-      2. A JSON mapping that contains the dictionary used for compression.
-    These two parts are separated by a line with the delimiter `===JSON_MAP===`.
+    This function reads an XML file, compresses its UTF-8 bytes using BPE, and saves the result to the output file
+    as a binary .comp container (see comp_format.py):
+      1. A fixed-size header with the original size and the section lengths.
+      2. The merge table, stored as pairs of integers.
+      3. The symbol stream, cut into blocks and coded as varints.
+      4. A block index mapping raw byte ranges (and, with index_users, <user> ids) to blocks,
+         which decompress_range and decompress_user use to decode only the blocks they need.
+    Use compress_xml_stream for files that do not fit in memory.
+
+    The container is written to output_file + ".part" and only renamed to output_file once it is
+    complete, so a failure leaves no partial .comp file behind.
 
     Parameters:
     -----------
     input_file : str
         Path to the input XML file to be compressed.
     output_file : str
-        Path to the output file where the compressed XML data and mapping will be saved.
+        Path to the output .comp file.
+    index_users : bool
+        Also record the id and byte range of every <user> record in the block index.
+    huffman : bool
+        Huffman-code the symbol stream of every block instead of storing one varint per symbol.
+    raw : bool
+        Compress the input bytes exactly as they are instead of parsing and re-serializing them, so
+        whitespace, the XML declaration and comments survive and malformed files can be compressed.
+    check : bool
+        With raw=True, refuse input that is not well-formed XML (see WellFormednessCheck).
+    block_size : int
+        Number of original bytes per block of the symbol stream; must be positive.
 
     Raises:
     -------
+    ValueError
+        If block_size is not positive.
     Exception
         If there is any error during the file operations, XML parsing, or compression process, an exception will be raised with an error message.
 
@@ -93,41 +445,254 @@ def compress_xml(input_file, output_file):
     -----------
     1. Ensure the input file contains valid XML content.
     2. Call the function with the path to the input file and the desired output file.
-    3. The output file will contain the compressed XML data and the JSON mapping.
+    3. Use decompress_xml to restore the XML content.
 
     Example:
     --------
-    Suppose you have an XML file `input.xml` with the following content:
-
-    ```
-    <xml>data</xml>
-    ```
-
-    Call the function as:
     ```python
-    compress_xml('input.xml', 'compressed.xml')
-    ```
-    After execution, `compressed.xml` will contain:
-    ```
-    <xml>@@</xml>
-    ===JSON_MAP===
-    {"@@": "data"}
+    compress_xml('input.xml', 'compressed.comp')
     ```
     """
 
+    if block_size <= 0:
+        raise ValueError(f"Block size must be positive, not {block_size}.")
+    partial_file = output_file + ".part"
     try:
-        # Parse the XML file
-        tree = ET.parse(input_file)
-        root = tree.getroot()
-        xml_data = ET.tostring(root, encoding='unicode')
-
-        # Perform Byte Pair Encoding (BPE) compression
-        compressed_data, mapping = byte_pair_encoding(xml_data)
-
-        # Write the compressed data and mapping to the output file
-        with open(output_file, 'w', encoding='utf-8') as file:
-            file.write(compressed_data + '\n')
-            file.write("===JSON_MAP===\n")
-            file.write(json.dumps(mapping))
+        if raw:
+            with open(input_file, 'rb') as file:
+                xml_data = file.read()
+            if check:
+                checker = WellFormednessCheck()
+                checker.feed(xml_data)
+                checker.close()
+        else:
+            # Parse the XML file
+            tree = ET.parse(input_file)
+            root = tree.getroot()
+            xml_data = ET.tostring(root, encoding='unicode').encode('utf-8')
+
+        # Perform Byte Pair Encoding (BPE) compression on the raw bytes
+        symbols, merges = learn_merges(xml_data, FIRST_MERGE_SYMBOL)
+
+        # Write the header, merge table and symbol blocks to the output file
+        with open(partial_file, 'wb') as file:
+            writer = ContainerWriter(file, merges, block_size, huffman=huffman)
+            for raw_length, block in split_symbols(symbols, merges, block_size):
+                writer.write_block(raw_length, block)
+
+            user_records = ()
+            if index_users:
+                indexer = UserIndexer()
+                indexer.feed(xml_data)
+                user_records = indexer.records
+            writer.close(user_records)
+        os.replace(partial_file, output_file)
+    except Exception as e:
+        print(f"Error compressing XML file: {e}")
+    finally:
+        if os.path.exists(partial_file):
+            os.remove(partial_file)
+
+
+class BpeCodec:
+    """
+    The Byte Pair Encoding block codec, the default codec of .comp containers.
+
+    Every block codec (see codec_registry.py) offers the same interface:
+
+    name, codec_id, huffman: Registry name, id stored in the container header, and whether the
+                             payloads are Huffman-coded (only meaningful for BPE).
+    learn(block): Learns the per-file state (the merge table) from the first block and returns
+                  (merges, payload of that block).
+    encode(block, merges): Returns the payload of one block.
+    decoder(merges): Returns a function that turns a payload back into the original bytes.
+    """
+
+    codec_id = CODEC_BPE
+
+    def __init__(self, huffman=False):
+        self.huffman = huffman
+        self.name = "huffman" if huffman else "bpe"
+
+    def learn(self, block):
+        # The encoding of the block the table was learned on comes for free
+        symbols, merges = learn_merges(block, FIRST_MERGE_SYMBOL)
+        return merges, encode_block_payload(symbols, self.huffman)
+
+    def encode(self, block, merges):
+        return encode_block_payload(apply_merges(block, merges), self.huffman)
+
+    def decoder(self, merges):
+        return partial(decode_block, table=expansion_table(merges), huffman=self.huffman)
+
+
+def read_blocks(file, block_size):
+    """Yield consecutive chunks of at most `block_size` bytes from an open binary file."""
+    while True:
+        block = file.read(block_size)
+        if not block:
+            return
+        yield block
+
+
+# Codec and merge table of a worker process, set once by _init_block_encoder
+_worker_codec = None
+_worker_merges = None
+
+
+def _init_block_encoder(codec, merges):
+    global _worker_codec, _worker_merges
+    _worker_codec = codec
+    _worker_merges = merges
+
+
+def _encode_block(block):
+    """Encode one raw block with the worker's codec and merge table and return (raw length, payload)."""
+    return len(block), _worker_codec.encode(block, _worker_merges)
+
+
+def compress_xml_stream(input_file, output_file, block_size=BLOCK_SIZE, merges=None, jobs=1, index_users=False,
+                        external_dictionary=False, huffman=False, codec=None, check=False):
+
+    """
+    Compress an XML file of any size with bounded memory.
+
+    The input is read in fixed-size blocks of raw bytes (no XML parsing). The merge table is learned
+    from the first block, or taken from `merges` when one is given, and every block is then encoded
+    on its own and appended to the .comp container. Peak memory is proportional to `block_size`,
+    not to the size of the file. decompress_xml reads the result block by block as well.
+
+    Blocks are independent once the merge table is known, so with jobs > 1 they are encoded in a pool
+    of worker processes and written back in their original order.
+
+    The container is written to output_file + ".part" and only renamed to output_file once it is
+    complete, so a failure (such as input that check rejects) leaves no partial .comp file behind.
+
+    Parameters:
+    -----------
+    input_file : str
+        Path to the input XML file to be compressed.
+    output_file : str
+        Path to the output .comp file.
+    block_size : int
+        Number of input bytes encoded per block; must be positive.
+    merges : list of (int, int), optional
+        A merge table to reuse instead of learning one.
+    external_dictionary : bool
+        `merges` comes from a shared dictionary file (see train_dictionary): store only its id
+        instead of the whole table, so decompression needs the same dictionary.
+    jobs : int
+        Number of worker processes used to encode blocks.
+    index_users : bool
+        Also record the id and byte range of every <user> record in the block index.
+    huffman : bool
+        Huffman-code the symbol stream of every block instead of storing one varint per symbol.
+    codec : object, optional
+        The block codec to use (see codec_registry.get_codec); defaults to BpeCodec(huffman).
+    check : bool
+        Check that the input is well-formed XML while it streams past (see WellFormednessCheck).
+
+    Raises:
+    -------
+    ValueError
+        If block_size is not positive: a zero size would write no blocks at all, and a negative one
+        would read the whole input as one block.
+    """
+
+    if block_size <= 0:
+        raise ValueError(f"Block size must be positive, not {block_size}.")
+    if codec is None:
+        codec = BpeCodec(huffman)
+
+    partial_file = output_file + ".part"
+    try:
+        with open(input_file, 'rb') as source, open(partial_file, 'wb') as file:
+            indexer = UserIndexer() if index_users else None
+            checker = WellFormednessCheck() if check else None
+            observers = [observer for observer in (indexer, checker) if observer is not None]
+            blocks = read_blocks(source, block_size)
+            if observers:
+                blocks = _observed_blocks(blocks, observers)
+            first = next(blocks, b'')
+
+            if merges is None:
+                merges, payload = codec.learn(first)
+            else:
+                payload = codec.encode(first, merges)
+
+            writer = ContainerWriter(file, merges, block_size, external_dictionary, codec.huffman, codec.codec_id)
+            if first:
+                writer.write_payload(len(first), payload)
+            for raw_length, payload in ordered_map(_encode_block, blocks, jobs, _init_block_encoder, (codec, merges)):
+                writer.write_payload(raw_length, payload)
+            if checker is not None:
+                checker.close()
+            writer.close(indexer.records if indexer is not None else ())
+        os.replace(partial_file, output_file)
+    except Exception as e:
+        print(f"Error compressing XML file: {e}")
+    finally:
+        if os.path.exists(partial_file):
+            os.remove(partial_file)
+
+
+def train_dictionary(corpus_dir, dictionary_file, max_merges=MAX_MERGES, sample_size=DICTIONARY_SAMPLE_SIZE):
+
+    """
+    Learn one merge table across a corpus of XML files and save it as a shared dictionary.
+
+    Small files give BPE too few repeats to learn from, so they barely shrink on their own. A table
+    learned on a sample of many similar files captures their common markup and vocabulary;
+    compress_xml_stream(..., merges=load_dictionary(path), external_dictionary=True) then only has to
+    encode each file, and the container stores just the dictionary id instead of a merge table.
+
+    Parameters:
+    -----------
+    corpus_dir : str
+        Directory with the sample .xml files (searched recursively).
+    dictionary_file : str
+        Path of the dictionary file to write.
+    max_merges : int
+        Upper bound on the size of the merge table.
+    sample_size : int
+        Total number of bytes read from the corpus. Every file contributes an equal share.
+
+    Returns:
+    --------
+    list
+        The learned merge table, or None on error.
+    """
+
+    try:
+        paths = sorted(
+            os.path.join(folder, name)
+            for folder, _, names in os.walk(corpus_dir)
+            for name in names
+            if name.endswith('.xml')
+        )
+        if not paths:
+            raise ValueError(f"No .xml files found in '{corpus_dir}'.")
+
+        share = max(sample_size // len(paths), 1)
+        # Every file is followed by a separator symbol of its own. A separator occurs once, so no pair
+        # with it is ever frequent enough to merge and no merge spans the end of one file and the start
+        # of the next. Separators are numbered past the last merge symbol, so they never collide.
+        sample = array('i')
+        separator = FIRST_MERGE_SYMBOL + max_merges
+        sampled = 0
+        for path in paths:
+            with open(path, 'rb') as file:
+                data = file.read(share)
+            sample.extend(data)
+            sample.append(separator)
+            separator += 1
+            sampled += len(data)
+            if sampled >= sample_size:
+                break
+
+        _, merges = learn_merges(sample, FIRST_MERGE_SYMBOL, max_merges)
+        with open(dictionary_file, 'wb') as file:
+            write_dictionary(file, merges)
+        return merges
     except Exception as e:
-        print(f"Error compressing XML file: {e}")
\ No newline at end of file
+        print(f"Error training dictionary: {e}")
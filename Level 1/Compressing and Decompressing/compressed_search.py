@@ -0,0 +1,248 @@
+'''
+Word search over .comp archives without decompressing them.
+
+The query is turned into a KMP automaton over (case-folded) bytes. For a BPE container every symbol
+of the merge table then gets its own transition column: the state the automaton ends in after reading
+the symbol's whole expansion, and whether a match ended on the way. Merge n is the concatenation of
+two earlier symbols, so its column is the composition of theirs and the table costs one pass over the
+merge table per query state. Scanning a block is then one lookup per stored symbol, which is
+proportional to the compressed size. Only the blocks where a match ends are decoded, to print the
+posts that contain the word.
+
+Containers written with other codecs (zlib, lz77) are decoded block by block and searched directly.
+'''
+
+import mmap
+import os
+from bisect import bisect_right
+
+from codec_registry import codec_for_container
+from comp_format import CODEC_BPE, FIRST_MERGE_SYMBOL, MAGIC, ContainerReader, decode_block_payload, is_container
+from decompress import _attach_dictionary, decode_legacy_text, decode_raw_range
+from structure_codec import decode_structured, is_structured
+
+# Bytes decoded on each side of a matching block to find the enclosing <body> and <user>
+CONTEXT_SIZE = 64 << 10
+
+
+class SearchAutomaton:
+    """
+    KMP automaton for one query, case-insensitive for ASCII letters.
+
+    delta[state][byte]: The next state; state len(pattern) means a match just ended.
+    steps(merges): Per-symbol transition columns for a merge table (see the module docstring).
+    """
+
+    def __init__(self, word):
+        self.pattern = word.lower().encode('utf-8')
+        if not self.pattern:
+            raise ValueError("The search word is empty.")
+
+        pattern = self.pattern
+        length = len(pattern)
+        delta = [[0] * 256 for _ in range(length + 1)]
+        delta[0][pattern[0]] = 1
+        restart = 0
+        for state in range(1, length + 1):
+            delta[state] = delta[restart][:]
+            if state < length:
+                delta[state][pattern[state]] = state + 1
+                restart = delta[restart][pattern[state]]
+
+        # Upper-case input bytes move the automaton like their lower-case letters
+        fold = bytes(range(256)).lower()
+        self.delta = [[row[byte] for byte in fold] for row in delta]
+
+    def steps(self, merges):
+        """
+        Build the transition column of every symbol of a merge table.
+
+        Returns:
+        --------
+        list
+            Symbol id -> list over states of (next state << 1) | (1 if a match ended inside the symbol).
+        """
+        final = len(self.pattern)
+        steps = [
+            [(row[byte] << 1) | (row[byte] == final) for row in self.delta]
+            for byte in range(FIRST_MERGE_SYMBOL)
+        ]
+        for first, second in merges:
+            after = steps[second]
+            steps.append([after[value >> 1] | (value & 1) for value in steps[first]])
+        return steps
+
+
+def scan_block(payload, huffman, steps, state):
+    """
+    Run the automaton over one BPE block payload without expanding it.
+
+    Returns:
+    --------
+    tuple : (int, bool)
+        - The state at the end of the block.
+        - Whether a match ended inside the block.
+    """
+    alphabet, ranks = decode_block_payload(payload, huffman)
+    columns = [steps[symbol] for symbol in alphabet]
+    matched = 0
+    for rank in ranks:
+        value = columns[rank][state]
+        state = value >> 1
+        matched |= value
+    return state, bool(matched & 1)
+
+
+def matching_blocks(reader, word):
+    """
+    Yield the numbers of the blocks of a version 2 container in which a match of `word` ends.
+
+    BPE blocks are scanned in the compressed domain; other codecs are decoded one block at a time.
+    """
+    codec = codec_for_container(reader)
+    if codec.codec_id == CODEC_BPE:
+        automaton = SearchAutomaton(word)
+        steps = automaton.steps(reader.merges)
+        state = 0
+        for number, (raw_length, payload) in enumerate(reader.blocks()):
+            state, matched = scan_block(payload, reader.huffman, steps, state)
+            if matched:
+                yield number
+        return
+
+    pattern = word.lower().encode('utf-8')
+    decode = codec.decoder(reader.merges)
+    tail = b''
+    for number, (raw_length, payload) in enumerate(reader.blocks()):
+        data = tail + decode(payload).lower()
+        if pattern in data:
+            yield number
+        tail = data[len(data) - len(pattern) + 1:] if len(pattern) > 1 else b''
+
+
+def _indexed_user(users, offset):
+    """Find the id of the <user> record holding raw offset `offset` in (sorted starts, ids) from the user index."""
+    starts, user_ids = users
+    index = bisect_right(starts, offset) - 1
+    return user_ids[index] if index >= 0 else '?'
+
+
+def _user_before(data, body_start):
+    """Find the id of the <user> record that holds a post from the text before it."""
+    user_start = data.rfind(b"<user>", 0, body_start)
+    if user_start == -1:
+        return '?'
+    id_start = data.find(b"<id>", user_start, body_start)
+    id_end = data.find(b"</id>", id_start, body_start)
+    if id_start == -1 or id_end == -1:
+        return '?'
+    return data[id_start + 4:id_end].strip().decode('utf-8', 'replace')
+
+
+def posts_containing(data, word, base=0, users=None):
+    """
+    Find the post bodies in `data` that contain `word` (case-insensitive).
+
+    Parameters:
+    -----------
+    data : bytes
+        Original XML bytes, starting at raw offset `base`.
+    word : str
+        The search word.
+    users : tuple, optional
+        (sorted raw starts, user ids) from the container's user index.
+
+    Returns:
+    --------
+    list of tuple
+        (raw offset of the body, user id, body text) for every matching post.
+    """
+    pattern = word.lower().encode('utf-8')
+    lowered = data.lower()
+    found = {}
+    position = lowered.find(pattern)
+    while position != -1:
+        body_start = data.rfind(b"<body>", 0, position)
+        if body_start != -1 and data.rfind(b"</body>", 0, position) < body_start and body_start not in found:
+            body_end = data.find(b"</body>", position)
+            body = data[body_start + 6:body_end if body_end != -1 else len(data)]
+            user = _indexed_user(users, base + body_start) if users else _user_before(data, body_start)
+            found[body_start] = (base + body_start, user, body.strip().decode('utf-8', 'replace'))
+        position = lowered.find(pattern, position + 1)
+    return list(found.values())
+
+
+def _decode_whole(file):
+    """Decode a structure-mode or legacy text file to bytes."""
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        if is_structured(buffer):
+            return decode_structured(buffer)
+        return decode_legacy_text(buffer[:].decode('utf-8')).encode('utf-8')
+
+
+def search_compressed(input_file, word, dictionary=None):
+    """
+    Search the post bodies of a .comp archive for a word (case-insensitive), like wordSearch does on
+    an XML file, and print every matching post with its user.
+
+    Version 2 containers are scanned block by block in the compressed domain (see the module docstring)
+    and only the blocks where the word occurs are decoded, so the cost of a search follows the compressed
+    size. Older formats are decompressed in memory first.
+
+    Parameters:
+    -----------
+    input_file : str
+        Path to the .comp file.
+    word : str
+        The word to search for.
+    dictionary : str, optional
+        Path to the shared dictionary the file was compressed with, if any.
+
+    Returns:
+    --------
+    list of tuple
+        (user id, post body) for every matching post, or None on error.
+
+    Example:
+    --------
+    ```python
+    search_compressed('archive.comp', 'sports')
+    ```
+    """
+    try:
+        matches = []
+        with open(input_file, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                raise ValueError("The input file is empty.")
+            head = file.read(len(MAGIC) + 1)
+            file.seek(0)
+
+            if is_container(head):
+                reader = ContainerReader(file)
+                _attach_dictionary(reader, dictionary)
+                reader.read_index()
+                users = None
+                if reader.users:
+                    ordered = sorted((start, user_id) for user_id, (start, end) in reader.users.items())
+                    users = ([start for start, _ in ordered], [user_id for _, user_id in ordered])
+
+                numbers = list(matching_blocks(reader, word))
+                for number in numbers:
+                    base = max(0, reader.raw_offsets[number] - CONTEXT_SIZE)
+                    data = decode_raw_range(reader, base, reader.raw_offsets[number + 1] + CONTEXT_SIZE)
+                    matches += posts_containing(data, word, base, users)
+                print(f"Scanned {reader.block_count} blocks, decoded {len(numbers)}.")
+            else:
+                matches = posts_containing(_decode_whole(file), word)
+
+        # Neighbouring matching blocks share context, so a post can be found twice
+        posts = {}
+        for offset, user, body in matches:
+            posts.setdefault(offset, (user, body))
+        for user, body in posts.values():
+            print(f"Found '{word}' in post: '{body}' by user: '{user}'")
+        if not posts:
+            print(f"'{word}' is not found in any post")
+        return list(posts.values())
+    except Exception as e:
+        print(f"Error searching compressed file: {e}")
@@ -2,16 +2,62 @@
 AUTHOR: AHMED HAITHAM ISMAIL EL-EBIDY
 '''
 
-import xml.etree.ElementTree as ET
 import json
+import mmap
+import os
 import sys
 
+from block_pool import ordered_map
+from codec_registry import codec_for_container
+from comp_format import MAGIC, ContainerReader, expansion_table, is_container, load_dictionary
+from structure_codec import decode_structured, is_structured
+
+WRITE_BUFFER_SIZE = 1 << 20     # bytes buffered by the output writer
+
+
+def build_expansion_table(mapping):
+    """
+    Compute the full expansion of every encoded character of a BPE mapping.
+
+    Each pair may itself contain encoded characters, so expansions are memoized: every
+    entry is built once from the (already expanded) halves of its pair.
+
+    Parameters:
+    -----------
+    mapping : dict
+        The dictionary mapping encoded characters to the original pairs.
+
+    Returns:
+    --------
+    dict
+        Encoded character -> the original text it stands for.
+
+    Time Complexity: O(K + S), where K is the number of entries and S the total length of the expansions.
+    """
+    expansions = {}
+    for new_char in mapping:
+        # Resolve with an explicit stack so entries can be listed in any order
+        stack = [new_char]
+        while stack:
+            char = stack[-1]
+            if char in expansions:
+                stack.pop()
+                continue
+            pending = [part for part in mapping[char] if part in mapping and part not in expansions]
+            if pending:
+                stack.extend(pending)
+                continue
+            expansions[char] = ''.join(expansions.get(part, part) for part in mapping[char])
+            stack.pop()
+    return expansions
+
 
 def reverse_bpe(data, mapping):
     """
     Reverse the Byte Pair Encoding (BPE) compression to recover the original data.
 
-    This function takes a compressed string and the mapping dictionary used for BPE and replaces encoded characters with their original pairs.
+    This function precomputes the expansion of every encoded character once and then rebuilds the
+    original string in a single pass over the compressed data, instead of one `str.replace` pass per mapping entry.
 
     Parameters:
     -----------
@@ -24,28 +70,40 @@ def reverse_bpe(data, mapping):
     --------
     str
         The decompressed string after reversing BPE.
+
+    Time Complexity: O(K + N), where K is the size of the mapping and N the length of the output.
     """
-    for new_char, pair in reversed(mapping.items()):
-        data = data.replace(new_char, ''.join(pair))
-    return data
+    expansions = build_expansion_table(mapping)
+    get = expansions.get
+    return ''.join([get(char, char) for char in data])
 
-def decompress_xml(input_file, output_file):
+def decompress_xml(input_file, output_file, jobs=1, dictionary=None):
     """
     Decompress an XML file that was previously compressed using a Byte Pair Encoding (BPE) technique.
 
-    The input file is expected to have two parts:
-      1. The compressed XML data.
-      2. A JSON mapping that contains the dictionary used for compression.
-    These two parts are separated by a line with the delimiter `===JSON_MAP===`.
+    The input file is expected to be a binary .comp container written by compress_xml or compress_xml_stream
+    (see comp_format.py). The container is decoded block by block, so memory use is bounded by the block size
+    rather than the file size. Every merge symbol is expanded once up front, so the output is written in a single
+    pass whose cost is linear in the output size, however many merges the encoder used.
+    Huffman-coded blocks (compress_xml(..., huffman=True)) are decoded through a lookup table built once per block.
+    With jobs > 1 the blocks are decoded in a pool of worker processes and written in their original order.
+    Structure-mode files (compress_xml_structured) are read from a memory mapping, and files in the older text layout (compressed data,
+    a `===JSON_MAP===` line and a JSON mapping) are still accepted.
+    The output is written to output_file + ".part" and only renamed to output_file once it is complete,
+    so a corrupted input leaves no truncated .xml file behind.
 
-    This function reverses the compression using the provided mapping and writes the decompressed XML content to the output file.
+    This function reverses the compression using the stored merge table and writes the decompressed XML content to the output file.
 
     Parameters:
     -----------
     input_file : str
-        Path to the input file containing the compressed XML data and JSON mapping.
+        Path to the input .comp file.
     output_file : str
         Path to the output file where the decompressed XML content will be saved.
+    jobs : int
+        Number of worker processes used to decode blocks.
+    dictionary : str, optional
+        Path to the shared dictionary the file was compressed with, if any.
 
     Raises:
     -------
@@ -54,46 +112,208 @@ def decompress_xml(input_file, output_file):
 
     How to Use:
     -----------
-    1. Ensure the input file is formatted correctly with the compressed data followed by `===JSON_MAP===` and the JSON mapping.
+    1. Ensure the input file was produced by compress_xml.
     2. Call the function with the path to the input file and the desired output file.
     3. The decompressed XML content will be written to the specified output file.
 
     Example:
     --------
-    Suppose you have a compressed XML file `compressed.xml` with the following content:
-
-    ```
-    <xml>@@ </xml>===JSON_MAP===
-    {"@@": "data"}
-    ```
-
-    Call the function as:
     ```python
-    decompress_xml('compressed.xml', 'decompressed.xml')
-    ```
-    After execution, `decompressed.xml` will contain:
-    ```
-    <xml>data</xml>
+    decompress_xml('compressed.comp', 'decompressed.xml')
     ```
     """
+    partial_file = output_file + ".part"
+    try:
+        with open(input_file, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                raise ValueError("The input file is empty.")
+            head = file.read(len(MAGIC) + 1)
+            file.seek(0)
+
+            # Write the decompressed XML content to the output file through a buffered writer
+            with open(partial_file, 'wb', buffering=WRITE_BUFFER_SIZE) as out:
+                if is_container(head):
+                    reader = ContainerReader(file)
+                    _attach_dictionary(reader, dictionary)
+                    decode_blocks(reader, out, jobs)
+                else:
+                    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                        if is_structured(buffer):
+                            out.write(decode_structured(buffer))
+                        else:
+                            out.write(decode_legacy_text(buffer[:].decode('utf-8')).encode('utf-8'))
+        os.replace(partial_file, output_file)
+    except Exception as e:
+        print(f"Error decompressing XML file: {e}")
+    finally:
+        if os.path.exists(partial_file):
+            os.remove(partial_file)
+
+
+# Block decoder of a worker process, set once by _init_block_decoder
+_worker_decode = None
+
+
+def _init_block_decoder(codec, merges):
+    global _worker_decode
+    _worker_decode = codec.decoder(merges)
+
+
+def _decode_block(block):
+    """Decode one (raw length, payload) block with the worker's block decoder."""
+    raw_length, payload = block
+    data = _worker_decode(payload)
+    if len(data) != raw_length:
+        raise ValueError(f"Corrupted .comp file: expected a block of {raw_length} bytes, decoded {len(data)}.")
+    return data
+
+
+def decode_blocks(reader, out, jobs=1):
+    """
+    Decode every block of a version 2 container, in order, and write the original bytes to `out`.
+
+    Only a bounded window of blocks is held in memory at a time; with jobs > 1 the window is
+    spread over a pool of worker processes.
+
+    Returns:
+    --------
+    int
+        The number of bytes written.
+    """
+    written = 0
+    for data in ordered_map(_decode_block, reader.blocks(), jobs, _init_block_decoder,
+                            (codec_for_container(reader), reader.merges)):
+        out.write(data)
+        written += len(data)
+
+    if written != reader.original_size:
+        raise ValueError(f"Corrupted .comp file: expected {reader.original_size} bytes, decoded {written}.")
+    return written
+
+
+def decode_raw_range(reader, start, end):
+    """
+    Decode only the blocks covering raw bytes start..end (end exclusive) and return those bytes.
+
+    `reader` is a ContainerReader whose index has been loaded with read_index(). An end past the
+    original size is clamped to it.
+
+    Raises:
+    -------
+    ValueError
+        If the range is not 0 <= start <= end, or start is past the end of the original file.
+    """
+    if start < 0 or start > end:
+        raise ValueError(f"Invalid range {start}:{end}. Use 0 <= START <= END.")
+    if start > reader.original_size:
+        raise ValueError(f"Range start {start} is past the end of the original file ({reader.original_size} bytes).")
+    end = min(end, reader.original_size)
+    if start == end:
+        return b''
+
+    numbers = reader.blocks_in_range(start, end)
+    decode = codec_for_container(reader).decoder(reader.merges)
+    parts = []
+    for number in numbers:
+        raw_length, payload = reader.read_block(number)
+        parts.append(decode(payload))
+    data = b''.join(parts)
+
+    first_raw = reader.raw_offsets[numbers[0]]
+    return data[start - first_raw:end - first_raw]
+
+
+def _attach_dictionary(reader, dictionary):
+    """Load the shared dictionary a container needs, if it needs one."""
+    if reader.dictionary_id is not None:
+        if dictionary is None:
+            raise ValueError("This .comp file was compressed with a shared dictionary. Pass it with --dict.")
+        reader.attach_dictionary(load_dictionary(dictionary))
+
+
+def _open_indexed(input_file, dictionary=None):
+    file = open(input_file, 'rb')
     try:
-        # Open the input file and read its contents
-        with open(input_file, 'r', encoding='utf-8') as file:
-            lines = file.readlines()
-        
-        # Split the file into compressed data and JSON mapping
-        delimiter_index = lines.index("===JSON_MAP===\n")
-        compressed_data = ''.join(lines[:delimiter_index]).strip()
-        mapping_json = ''.join(lines[delimiter_index + 1:]).strip()
-        
-        # Parse the JSON mapping
-        mapping = json.loads(mapping_json)
-
-        # Reverse the compression
-        decompressed_data = reverse_bpe(compressed_data, mapping)
-
-        # Write the decompressed XML content to the output file
-        with open(output_file, 'w', encoding='utf-8') as file:
-            file.write(decompressed_data)
+        reader = ContainerReader(file)
+        _attach_dictionary(reader, dictionary)
+        reader.read_index()
+    except Exception:
+        file.close()
+        raise
+    return file, reader
+
+
+def decompress_range(input_file, output_file, start, end, dictionary=None):
+    """
+    Decompress only the original bytes start..end (end exclusive) of a .comp file.
+
+    The block index tells which blocks hold that range, so only those blocks are read and decoded.
+
+    Parameters:
+    -----------
+    input_file : str
+        Path to the input .comp file.
+    output_file : str
+        Path to the output file.
+    start, end : int
+        Byte offsets into the original (uncompressed) file, with 0 <= start <= end; an end past the
+        original size is clamped to it. Invalid ranges are reported and nothing is written.
+    dictionary : str, optional
+        Path to the shared dictionary the file was compressed with, if any.
+    """
+    try:
+        file, reader = _open_indexed(input_file, dictionary)
+        with file:
+            data = decode_raw_range(reader, start, end)
+        with open(output_file, 'wb') as out:
+            out.write(data)
     except Exception as e:
-        print(f"Error decompressing XML file: {e}")
\ No newline at end of file
+        print(f"Error decompressing XML file: {e}")
+
+
+def decompress_user(input_file, output_file, user_id, dictionary=None):
+    """
+    Decompress the <user> record with the given id from a .comp file written with a user index.
+
+    Only the blocks holding that record are read and decoded.
+
+    Parameters:
+    -----------
+    input_file : str
+        Path to the input .comp file.
+    output_file : str
+        Path to the output file.
+    user_id : str
+        The text of the record's <id> element.
+    dictionary : str, optional
+        Path to the shared dictionary the file was compressed with, if any.
+    """
+    try:
+        file, reader = _open_indexed(input_file, dictionary)
+        with file:
+            if not reader.users:
+                raise ValueError("This .comp file has no user index. Compress it with --user-index.")
+            if user_id not in reader.users:
+                raise ValueError(f"User '{user_id}' was not found in the index.")
+            start, end = reader.users[user_id]
+            data = decode_raw_range(reader, start, end)
+        with open(output_file, 'wb') as out:
+            out.write(data)
+    except Exception as e:
+        print(f"Error decompressing XML file: {e}")
+
+
+def decode_legacy_text(content):
+    """
+    Decode the older text layout: compressed data, a `===JSON_MAP===` line, then the JSON mapping.
+    """
+    delimiter = "\n===JSON_MAP===\n"
+    if delimiter not in content:
+        raise ValueError("Invalid compressed data format. Missing '===JSON_MAP===' delimiter.")
+    compressed_data, mapping_json = content.split(delimiter, 1)
+
+    # Parse the JSON mapping
+    mapping = json.loads(mapping_json.strip())
+
+    # Reverse the compression
+    return reverse_bpe(compressed_data.strip(), mapping)
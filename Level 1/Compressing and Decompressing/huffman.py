@@ -0,0 +1,146 @@
+'''
+Canonical Huffman coding of a block's symbol stream, used by .comp containers written with
+compress_xml(..., huffman=True), the "huffman" codec, or `compress --entropy huffman` on the
+command line (see comp_format.py).
+
+The varint payload spends at least a whole byte on every symbol. A Huffman code spends about as many
+bits as the symbol's share of the block is worth, so frequent symbols (whitespace runs, common tags)
+cost a few bits each.
+
+Only the code lengths are stored; both sides rebuild the same canonical codes from them. Lengths are
+limited to MAX_CODE_LENGTH bits so that decoding is a single lookup in a table of 2 ** max_length
+entries per symbol.
+'''
+
+import heapq
+
+MAX_CODE_LENGTH = 15
+
+
+def code_lengths(frequencies, max_length=MAX_CODE_LENGTH):
+    """
+    Compute Huffman code lengths, none longer than max_length bits.
+
+    Parameters:
+    -----------
+    frequencies : list of int
+        The count of every symbol of the alphabet (all positive).
+    max_length : int
+        The longest code allowed; 2 ** max_length must be at least the alphabet size.
+
+    Returns:
+    --------
+    list of int
+        The code length of every symbol, in the order of `frequencies`.
+    """
+    count = len(frequencies)
+    if count == 1:
+        return [1]
+
+    while True:
+        heap = [(frequency, symbol) for symbol, frequency in enumerate(frequencies)]
+        heapq.heapify(heap)
+        # Parents always get a higher node number than their children
+        parent = [0] * (2 * count - 1)
+        node = count
+        while len(heap) > 1:
+            first_frequency, first = heapq.heappop(heap)
+            second_frequency, second = heapq.heappop(heap)
+            parent[first] = parent[second] = node
+            heapq.heappush(heap, (first_frequency + second_frequency, node))
+            node += 1
+
+        depth = [0] * node
+        for child in range(node - 2, -1, -1):
+            depth[child] = depth[parent[child]] + 1
+        lengths = depth[:count]
+        if max(lengths) <= max_length:
+            return lengths
+        # Flatten the distribution and try again; this always ends with a balanced tree at worst
+        frequencies = [(frequency >> 1) | 1 for frequency in frequencies]
+
+
+def canonical_codes(lengths):
+    """
+    Assign canonical codes: shorter codes first, ties broken by symbol order.
+
+    Returns:
+    --------
+    list of int
+        The code of every symbol, as an integer of lengths[symbol] bits.
+    """
+    codes = [0] * len(lengths)
+    code = 0
+    previous_length = 0
+    for symbol in sorted(range(len(lengths)), key=lengths.__getitem__):
+        code <<= lengths[symbol] - previous_length
+        previous_length = lengths[symbol]
+        codes[symbol] = code
+        code += 1
+    return codes
+
+
+def encode_symbols(ranks, lengths):
+    """
+    Huffman-code a stream of ranks (indexes into the alphabet) and return the bytes, most significant bit first.
+    """
+    codes = canonical_codes(lengths)
+    words = [format(code, f"0{length}b") for code, length in zip(codes, lengths)]
+    bits = ''.join(map(words.__getitem__, ranks))
+    if not bits:
+        return b''
+    padding = -len(bits) % 8
+    return int(bits + '0' * padding, 2).to_bytes((len(bits) + padding) // 8, 'big')
+
+
+def decoding_table(lengths):
+    """
+    Build the lookup table of a canonical code.
+
+    Returns:
+    --------
+    tuple : (list, int)
+        - Entry i holds (rank << 4) | code length of the symbol whose code is a prefix of the
+          max_length-bit number i.
+        - max_length, the longest code length.
+    """
+    max_length = max(lengths)
+    table = [0] * (1 << max_length)
+    for rank, (code, length) in enumerate(zip(canonical_codes(lengths), lengths)):
+        span = 1 << (max_length - length)
+        start = code << (max_length - length)
+        table[start:start + span] = [(rank << 4) | length] * span
+    return table, max_length
+
+
+def decode_symbols(data, lengths, count):
+    """
+    Decode `count` ranks from the bytes written by encode_symbols.
+
+    Returns:
+    --------
+    list of int
+        The ranks, in order.
+    """
+    if not count:
+        return []
+    table, max_length = decoding_table(lengths)
+    mask = (1 << max_length) - 1
+
+    # Read 4 bytes at a time into a small bit buffer; the padding keeps every read whole
+    data = bytes(data) + bytes(4 + -len(data) % 4)
+    ranks = []
+    append = ranks.append
+    buffer = 0
+    buffered = 0
+    position = 0
+    for _ in range(count):
+        if buffered < max_length:
+            buffer = (buffer << 32) | int.from_bytes(data[position:position + 4], 'big')
+            position += 4
+            buffered += 32
+        entry = table[(buffer >> (buffered - max_length)) & mask]
+        append(entry >> 4)
+        buffered -= entry & 15
+        buffer &= (1 << buffered) - 1
+    return ranks
@@ -0,0 +1,371 @@
+'''
+XML-structure-aware compression (the XMill approach).
+
+The document is split into three kinds of streams that are compressed separately:
+
+  - names:      every distinct tag name, once.
+  - structure:  one small integer token per tag or text node: TEXT, SPACE, MARKUP,
+                OPEN k or CLOSE k (k is the index of the tag name).
+  - containers: the text of each tag path ("users/user/id", "users/user/posts/post/body", ...)
+                in its own container, plus one container for whitespace (indentation around text
+                and between tags) and one
+                for any markup that is not a plain <name> or </name> tag (attributes,
+                comments, declarations), so the round trip is byte-exact.
+
+Values that come from the same path look alike, so BPE finds far more repeats inside a
+container than in the interleaved document, and repeated markup costs one token instead of
+merge slots.
+
+File layout (all counts are varints):
+
+    4  magic b"XMLS"
+    1  format version (1)
+    3  reserved
+    8  original size in bytes
+       names:      count, then length + UTF-8 bytes per name
+       structure:  packet
+       containers: count, then per container: path length, path name indexes, packet
+
+A packet is one BPE-coded sequence: first new symbol, merge count, merge table, and a block
+payload as written by comp_format.encode_block_payload.
+'''
+
+import re
+import struct
+from itertools import repeat
+
+from compress import MAX_MERGES, WellFormednessCheck, learn_merges
+from comp_format import FIRST_MERGE_SYMBOL, decode_varints, encode_block_payload, encode_varints, expansion_table
+
+STRUCTURE_MAGIC = b"XMLS"
+STRUCTURE_VERSION = 1
+STRUCTURE_HEADER = struct.Struct("<4sB3xQ")
+
+# Structure tokens; OPEN k is FIRST_TAG_TOKEN + 2k and CLOSE k is FIRST_TAG_TOKEN + 2k + 1
+TEXT, SPACE, MARKUP = 0, 1, 2
+FIRST_TAG_TOKEN = 3
+
+# Container paths for the two containers that are not tied to a tag path
+SPACE_PATH = (-1,)
+MARKUP_PATH = (-2,)
+
+SEPARATOR = b"\0"
+
+TOKEN = re.compile(rb"<[^>]*>?|[^<]+")
+PLAIN_TAG = re.compile(rb"<(/?)([A-Za-z_][\w.:-]*)>\Z")
+
+
+def _move(stack, token, name_id):
+    """Apply an OPEN / CLOSE to the path stack. Encoder and decoder use the same rule."""
+    if token % 2 == 1:
+        stack.append(name_id)
+    elif name_id in stack:
+        # close the innermost element with that name, and anything left open inside it
+        while stack.pop() != name_id:
+            pass
+
+
+def split_structure(data):
+    """
+    Split an XML document (bytes) into tag names, structure tokens and per-path containers.
+
+    Returns:
+    --------
+    tuple : (list, list, dict)
+        - Tag names (bytes) in order of first appearance.
+        - Structure tokens.
+        - Container path (tuple of name indexes) -> list of values (bytes).
+
+    Raises:
+    -------
+    ValueError
+        If the data contains NUL bytes, which are used to separate values in a container.
+    """
+    if SEPARATOR in data:
+        raise ValueError("Structure mode needs XML without NUL bytes.")
+
+    names = []
+    name_ids = {}
+    tokens = []
+    spaces = []
+    containers = {SPACE_PATH: spaces}
+    stack = []
+
+    for match in TOKEN.finditer(data):
+        piece = match.group()
+        if piece[0] != 0x3C:  # text node
+            # indentation around the text goes to the whitespace container, so the path
+            # containers only hold the values themselves
+            text = piece.strip()
+            if not text:
+                tokens.append(SPACE)
+                spaces.append(piece)
+                continue
+            start = len(piece) - len(piece.lstrip())
+            end = start + len(text)
+            if start:
+                tokens.append(SPACE)
+                spaces.append(piece[:start])
+            tokens.append(TEXT)
+            containers.setdefault(tuple(stack), []).append(text)
+            if end < len(piece):
+                tokens.append(SPACE)
+                spaces.append(piece[end:])
+            continue
+
+        tag = PLAIN_TAG.match(piece)
+        if tag is None:
+            tokens.append(MARKUP)
+            containers.setdefault(MARKUP_PATH, []).append(piece)
+            continue
+
+        closing, name = tag.groups()
+        name_id = name_ids.get(name)
+        if name_id is None:
+            name_id = name_ids[name] = len(names)
+            names.append(name)
+        token = FIRST_TAG_TOKEN + 2 * name_id + (1 if closing else 0)
+        tokens.append(token)
+        _move(stack, token, name_id)
+
+    return names, tokens, containers
+
+
+def join_structure(names, runs, containers):
+    """
+    Rebuild the document from the output of split_structure.
+
+    The structure tokens come in runs (the expansions of the BPE symbols of the structure packet).
+    The same run always starts from one of a handful of tag paths, so the pieces a run produces
+    from a given path are worked out once and every later occurrence only pulls the next values
+    from the containers.
+
+    Parameters:
+    -----------
+    names : list
+        Tag names (bytes) in order of first appearance.
+    runs : iterable
+        Tuples of structure tokens, in document order; `[(token,) for token in tokens]` for a
+        plain token list.
+    containers : dict
+        Container path (tuple of name indexes) -> list of values (bytes).
+
+    Returns:
+    --------
+    bytes
+        The original document.
+    """
+    open_tags = [b"<" + name + b">" for name in names]
+    close_tags = [b"</" + name + b">" for name in names]
+    cursors = {path: iter(values).__next__ for path, values in containers.items()}
+
+    # Paths seen so far, and per path: run -> (path id after the run, piece sources)
+    paths = [()]
+    path_ids = {(): 0}
+    steps = [{}]
+
+    sources = []
+    state = 0
+    for run in runs:
+        step = steps[state].get(run)
+        if step is None:
+            stack = list(paths[state])
+            pieces = []
+            tags = []
+            for token in run:
+                if token >= FIRST_TAG_TOKEN:
+                    name_id = (token - FIRST_TAG_TOKEN) // 2
+                    tags.append(open_tags[name_id] if token % 2 == 1 else close_tags[name_id])
+                    _move(stack, token, name_id)
+                    continue
+                if tags:
+                    pieces.append(repeat(b"".join(tags)).__next__)
+                    tags = []
+                if token == TEXT:
+                    path = tuple(stack)
+                elif token == SPACE:
+                    path = SPACE_PATH
+                else:
+                    path = MARKUP_PATH
+                if path not in cursors:
+                    raise ValueError("Corrupted .comp file: structure refers to a missing container.")
+                pieces.append(cursors[path])
+            if tags:
+                pieces.append(repeat(b"".join(tags)).__next__)
+
+            path = tuple(stack)
+            target = path_ids.get(path)
+            if target is None:
+                target = path_ids[path] = len(paths)
+                paths.append(path)
+                steps.append({})
+            step = steps[state][run] = (target, pieces)
+        state, pieces = step
+        sources += pieces
+    return b"".join([source() for source in sources])
+
+
+def encode_packet(symbols, first_symbol, out):
+    """BPE-code a sequence of integers (bytes work directly) and append the packet to `out`."""
+    encoded, merges = learn_merges(symbols, first_symbol, MAX_MERGES)
+    encode_varints((first_symbol, len(merges)), out)
+    for first, second in merges:
+        encode_varints((first, second), out)
+    out += encode_block_payload(encoded)
+    return out
+
+
+def _read_packet(buffer, offset):
+    """Read a packet written by encode_packet: (first symbol, merge pairs, alphabet, ranks), offset."""
+    (first_symbol, merge_count), offset = decode_varints(buffer, offset, 2)
+    flat, offset = decode_varints(buffer, offset, 2 * merge_count)
+    (symbol_count, alphabet_size), offset = decode_varints(buffer, offset, 2)
+    alphabet, offset = decode_varints(buffer, offset, alphabet_size)
+    ranks, offset = decode_varints(buffer, offset, symbol_count)
+    return (first_symbol, zip(flat[0::2], flat[1::2]), alphabet, ranks), offset
+
+
+def decode_runs(buffer, offset):
+    """
+    Decode the structure packet into runs: one tuple of tokens per coded symbol.
+
+    Returns:
+    --------
+    tuple : (list, int)
+        - The runs, in order; chained together they are the structure tokens.
+        - The offset just past the packet.
+    """
+    (first_symbol, merges, alphabet, ranks), offset = _read_packet(buffer, offset)
+    table = [(symbol,) for symbol in range(first_symbol)]
+    for first, second in merges:
+        table.append(table[first] + table[second])
+    by_rank = [table[symbol] for symbol in alphabet]
+    return list(map(by_rank.__getitem__, ranks)), offset
+
+
+def decode_values(buffer, offset):
+    """
+    Decode a container packet into its bytes (the values joined by SEPARATOR).
+
+    Returns:
+    --------
+    tuple : (bytes, int)
+        - The container bytes.
+        - The offset just past the packet.
+    """
+    (first_symbol, merges, alphabet, ranks), offset = _read_packet(buffer, offset)
+    if first_symbol != FIRST_MERGE_SYMBOL:
+        raise ValueError("Corrupted .comp file: bad container packet.")
+    table = expansion_table(merges)
+    by_rank = [table[symbol] for symbol in alphabet]
+    return b"".join(map(by_rank.__getitem__, ranks)), offset
+
+
+def encode_structured(data):
+    """
+    Compress an XML document (bytes) in structure mode and return the complete file contents.
+    """
+    names, tokens, containers = split_structure(data)
+
+    out = bytearray(STRUCTURE_HEADER.pack(STRUCTURE_MAGIC, STRUCTURE_VERSION, len(data)))
+
+    encode_varints([len(names)], out)
+    for name in names:
+        encode_varints([len(name)], out)
+        out += name
+
+    encode_packet(tokens, FIRST_TAG_TOKEN + 2 * len(names), out)
+
+    encode_varints([len(containers)], out)
+    for path, values in containers.items():
+        encode_varints([len(path)], out)
+        # shift by 2 so the special paths (-1, -2) stay non-negative
+        encode_varints([name_id + 2 for name_id in path], out)
+        encode_packet(SEPARATOR.join(values), FIRST_MERGE_SYMBOL, out)
+    return out
+
+
+def decode_structured(buffer):
+    """
+    Decode a structure-mode file held in `buffer` (bytes or mmap) and return the original bytes.
+
+    Raises:
+    -------
+    ValueError
+        If the buffer is not a structure-mode file or is corrupted.
+    """
+    magic, version, original_size = STRUCTURE_HEADER.unpack_from(buffer, 0)
+    if magic != STRUCTURE_MAGIC:
+        raise ValueError("Not a structure-mode .comp file (bad magic bytes).")
+    if version != STRUCTURE_VERSION:
+        raise ValueError(f"Unsupported structure-mode version {version}.")
+    offset = STRUCTURE_HEADER.size
+
+    (name_count,), offset = decode_varints(buffer, offset, 1)
+    names = []
+    for _ in range(name_count):
+        (length,), offset = decode_varints(buffer, offset, 1)
+        names.append(bytes(buffer[offset:offset + length]))
+        offset += length
+
+    runs, offset = decode_runs(buffer, offset)
+
+    (container_count,), offset = decode_varints(buffer, offset, 1)
+    containers = {}
+    for _ in range(container_count):
+        (length,), offset = decode_varints(buffer, offset, 1)
+        path, offset = decode_varints(buffer, offset, length)
+        values, offset = decode_values(buffer, offset)
+        containers[tuple(name_id - 2 for name_id in path)] = values.split(SEPARATOR)
+
+    data = join_structure(names, runs, containers)
+    if len(data) != original_size:
+        raise ValueError(f"Corrupted .comp file: expected {original_size} bytes, decoded {len(data)}.")
+    return data
+
+
+def is_structured(buffer):
+    """Return True if `buffer` starts with the structure-mode magic bytes."""
+    return len(buffer) > len(STRUCTURE_MAGIC) and buffer[:len(STRUCTURE_MAGIC)] == STRUCTURE_MAGIC
+
+
+def compress_xml_structured(input_file, output_file, check=False):
+    """
+    Compress an XML file in structure mode: tags become small integer tokens and the text under each
+    tag path is compressed in its own container (see the module docstring).
+
+    The input bytes are stored exactly as they are, so the file does not have to be well formed.
+    The whole file is held in memory; use compress_xml_stream for files that do not fit.
+
+    Parameters:
+    -----------
+    input_file : str
+        Path to the input XML file to be compressed.
+    output_file : str
+        Path to the output .comp file.
+    check : bool
+        Refuse input that is not well-formed XML (see compress.WellFormednessCheck).
+
+    Raises:
+    -------
+    Exception
+        If there is any error during the file operations or compression process, an exception will be raised with an error message.
+
+    Example:
+    --------
+    ```python
+    compress_xml_structured('input.xml', 'compressed.comp')
+    ```
+    """
+    try:
+        with open(input_file, 'rb') as file:
+            data = file.read()
+        if check:
+            checker = WellFormednessCheck()
+            checker.feed(data)
+            checker.close()
+        compressed = encode_structured(data)
+        with open(output_file, 'wb') as file:
+            file.write(compressed)
+    except Exception as e:
+        print(f"Error compressing XML file: {e}")
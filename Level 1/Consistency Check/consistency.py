@@ -1,9 +1,30 @@
 import argparse
+import codecs
+import itertools
+import json
+import os
 import xml.etree.ElementTree as ET
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from xml.parsers import expat
+
+# Characters (bytes in the workers of iter_file_errors) read at a time when checking a file
+CHUNK_SIZE = 1 << 20
+
+# Largest byte range one worker of iter_file_errors checks at a time
+PARALLEL_RANGE_SIZE = 64 << 20
 
 
 # Parsing Command-Line Arguments
+def positive_int(value):
+    """argparse type for options that must be a whole number above zero."""
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, not {value}")
+    return number
+
+
 def parse_arguments():
     """
     For command line use
@@ -13,85 +34,520 @@ def parse_arguments():
     parser.add_argument(
         "verify", help="Verify the XML file, Checking Consistency", choices=["verify"]
     )
-    parser.add_argument("-i", "--input", required=True, help="Input XML file ")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("-i", "--input", help="Input XML file ")
+    source.add_argument("--input-dir", help="Verify every XML file in this directory")
     parser.add_argument(
         "-f", "--fix", action="store_true", help="Fix errors found in the input file"
     )
     parser.add_argument("-o", "--output", help="Output file for fixed XML")
-    return parser.parse_args()
+    parser.add_argument(
+        "--stream", action="store_true", help="Read the file in chunks and print errors as JSON lines"
+    )
+    parser.add_argument(
+        "--max-errors", type=positive_int, help="Stop after this many errors (needs --stream)"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1, help="Worker processes used to check the file"
+    )
+    parser.add_argument("--report", help="With --input-dir, JSON file for the report")
+    args = parser.parse_args()
+    if args.max_errors is not None and (args.input_dir or not args.stream):
+        parser.error("--max-errors only works with --stream on a single --input file")
+    return args
 
 
-def check_xml_consistency(xml_lines):
-    tag_list = []  # List to track opened tags with line numbers
-    errors = []  # List to store errors
+def iter_tags(xml_lines):
+    """
+    Walk the lines as one token stream and yield (line_num, tag_content) for every tag.
 
-    for line_num, line in enumerate(xml_lines, start=1):
-        line = line.strip()
+    tag_content is the text between "<" and ">", stripped. A tag may span several lines; its
+    line number is the line of its "<". An unterminated tag at the end of the input runs to the end.
+    """
+    pending = None  # (line number, pieces) of a tag that continues on the next line
 
-        start = line.find("<")
+    for line_num, line in enumerate(xml_lines, start=1):
+        position = 0
+        if pending is not None:
+            end = line.find(">")
+            if end == -1:
+                pending[1].append(line)
+                continue
+            pending[1].append(line[:end])
+            yield pending[0], "".join(pending[1]).strip()
+            pending = None
+            position = end + 1
+
+        start = line.find("<", position)
         while start != -1:
             end = line.find(">", start)
+            if end == -1:
+                # the tag continues on the next line
+                pending = (line_num, [line[start + 1 :]])
+                break
 
-            # Extract the tag content
-            tag_content = line[start + 1 : end].strip()
-
-            is_closing = tag_content.startswith("/")
-            is_self_closing = tag_content.endswith("/")
-            comment_tag = tag_content.startswith("!")
-
-            if is_closing:
-                # Extract the tag name for closing tag
-                tag_name = tag_content[1:].split()[0]
-                matched = False
-
-                # Search for matching opening tag in the stack
-                for i in range(len(tag_list) - 1, -1, -1):
-                    list_tag_name, opening_line = tag_list[i]
-                    if list_tag_name == tag_name:
-                        tag_list.pop(i)  # Remove the matched opening tag from the stack
-                        matched = True
-                        break
-
-                if not matched:
-                    # If no matching opening tag, log the error
-                    errors.append(
-                        (
-                            line_num,
-                            f"Unexpected closing tag: </{tag_name}>. There is no matching opening tag.",
-                        )
-                    )
-
-            elif is_self_closing or comment_tag:
-                # Ignore self-closing or comment tags as they don't affect xml structure
-                pass
-
-            else:
-                # opening tag, track it with its line number
-                tag_name = tag_content.split()[0]
-                tag_list.append(
-                    (tag_name, line_num)
-                )  # used in order to track opening tag line number in case of many tags with the same name
+            yield line_num, line[start + 1 : end].strip()
 
             # Look for the next tag in the line
             start = line.find("<", end)
 
+    if pending is not None:
+        yield pending[0], "".join(pending[1]).strip()
+
+
+def iter_chunk_tags(chunks):
+    """
+    Like iter_tags, for text that arrives in chunks of any size, such as file.read(CHUNK_SIZE).
+
+    Line numbers are counted from the newlines, so a chunk may end in the middle of a line or of a
+    tag; only the unfinished tag is carried over to the next chunk.
+    """
+    line_num = 1
+    pending = None  # (line number, pieces) of a tag that continues in the next chunk
+
+    for chunk in chunks:
+        position = 0
+        if pending is not None:
+            end = chunk.find(">")
+            if end == -1:
+                pending[1].append(chunk)
+                line_num += chunk.count("\n")
+                continue
+            pending[1].append(chunk[:end])
+            line_num += chunk.count("\n", 0, end)
+            yield pending[0], "".join(pending[1]).strip()
+            pending = None
+            position = end + 1
+
+        start = chunk.find("<", position)
+        while start != -1:
+            line_num += chunk.count("\n", position, start)
+            end = chunk.find(">", start)
+            if end == -1:
+                # the tag continues in the next chunk
+                pending = (line_num, [chunk[start + 1 :]])
+                break
+
+            yield line_num, chunk[start + 1 : end].strip()
+            line_num += chunk.count("\n", start, end)
+
+            # Look for the next tag in the chunk
+            position = end + 1
+            start = chunk.find("<", position)
+        else:
+            # no unfinished tag: the rest of the chunk is text
+            start = position
+        line_num += chunk.count("\n", start)
+
+    if pending is not None:
+        yield pending[0], "".join(pending[1]).strip()
+
+
+class _TagStack:
+    """
+    Opening tags that are still open, in document order.
+
+    A closing tag matches the most recent open tag with the same name, even if other tags were
+    opened after it (those stay open). Every name keeps the positions of its own open tags, so
+    both push and close cost O(1) amortized however deep or broken the document is.
+    """
+
+    def __init__(self):
+        self.entries = []  # [tag_name, line_num, is_open]
+        self.positions = {}  # tag_name -> positions in entries of its open tags
+
+    def push(self, tag_name, line_num):
+        self.positions.setdefault(tag_name, []).append(len(self.entries))
+        self.entries.append([tag_name, line_num, True])
+
+    def close(self, tag_name):
+        """Close the most recent open <tag_name>; return False if there is none."""
+        positions = self.positions.get(tag_name)
+        if not positions:
+            return False
+        self.entries[positions.pop()][2] = False
+
+        # Drop closed entries from the top so the list only grows with tags that are really open
+        entries = self.entries
+        while entries and not entries[-1][2]:
+            entries.pop()
+        return True
+
+    def unclosed(self):
+        """Return (tag_name, line_num) of every tag still open, innermost first."""
+        return [(tag_name, line_num) for tag_name, line_num, is_open in reversed(self.entries) if is_open]
+
+
+def _match_tags(tags, tag_list):
+    """
+    Match a stream of (line_num, tag_content) against the open tags in tag_list.
+
+    Opening tags are pushed onto tag_list and closing tags close the most recent open tag with their
+    name. Yields (line_num, tag_name) for every closing tag that has no open tag to close.
+    """
+    for line_num, tag_content in tags:
+        is_closing = tag_content.startswith("/")
+        is_self_closing = tag_content.endswith("/")
+        comment_tag = tag_content.startswith("!") or tag_content.startswith("?")
+
+        if is_closing:
+            # Extract the tag name for closing tag
+            name = tag_content[1:].split()
+            if not name:
+                continue
+            tag_name = name[0]
+
+            # Remove the matching opening tag from the stack
+            if not tag_list.close(tag_name):
+                yield line_num, tag_name
+
+        elif is_self_closing or comment_tag or not tag_content:
+            # Ignore self-closing, comment and declaration tags as they don't affect xml structure
+            pass
+
+        else:
+            # opening tag, track it with its line number
+            tag_list.push(tag_content.split()[0], line_num)
+
+
+def _unexpected_closing(line_num, tag_name):
+    return (
+        line_num,
+        f"Unexpected closing tag: </{tag_name}>. There is no matching opening tag.",
+    )
+
+
+def _unclosed_errors(tag_list):
     #  check if any opening tags are left unclosed
-    while tag_list:
-        tag_name, opening_line = tag_list.pop()
-        errors.append(
-            (
-                opening_line,
-                f"<{tag_name}> has no closing tag.",
-            )
+    for tag_name, opening_line in tag_list.unclosed():
+        yield (
+            opening_line,
+            f"<{tag_name}> has no closing tag.",
         )
 
+
+def iter_errors(tags):
+    """
+    Check a stream of (line_num, tag_content) from iter_tags or iter_chunk_tags and yield
+    (line_num, message) for every error as soon as it is known: unexpected closing tags where they
+    occur, tags without a closing tag once the stream ends.
+    """
+    tag_list = _TagStack()  # opened tags with line numbers
+    for line_num, tag_name in _match_tags(tags, tag_list):
+        yield _unexpected_closing(line_num, tag_name)
+    yield from _unclosed_errors(tag_list)
+
+
+def split_ranges(input_file, count):
+    """
+    Cut a file into about `count` byte ranges that each start at a tag.
+
+    Every cut is moved forward to the first "<" after the next ">", so no tag is split between
+    two ranges (a ">" or "<" inside a comment or an attribute value can still fool it).
+    """
+    size = os.path.getsize(input_file)
+    starts = [0]
+    with open(input_file, "rb") as file:
+        for number in range(1, count):
+            position = max(size * number // count, starts[-1])
+            file.seek(position)
+            buffer = b""
+            while True:
+                piece = file.read(CHUNK_SIZE)
+                if not piece:
+                    position = size
+                    break
+                buffer += piece
+                end = buffer.find(b">")
+                start = buffer.find(b"<", end + 1) if end != -1 else -1
+                if start != -1:
+                    position += start
+                    break
+            if position >= size:
+                break
+            if position > starts[-1]:
+                starts.append(position)
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def _summarize_range(input_file, start, end, chunk_size=CHUNK_SIZE):
+    """
+    Reduce one byte range of a file to the part of the tag matching that depends on other ranges.
+
+    Returns:
+    --------
+    tuple : (int, list, list)
+        - The number of newlines in the range.
+        - (line_num, tag_name) of the closing tags with no open tag in the range, in order.
+        - (tag_name, line_num) of the tags the range leaves open, in document order.
+        Line numbers count from 1 at the start of the range.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    newlines = 0
+
+    def chunks():
+        nonlocal newlines
+        with open(input_file, "rb") as file:
+            file.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                data = file.read(min(chunk_size, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                newlines += data.count(b"\n")
+                yield decoder.decode(data)
+        yield decoder.decode(b"", final=True)
+
+    tag_list = _TagStack()
+    closes = list(_match_tags(iter_chunk_tags(chunks()), tag_list))
+    opens = [(tag_name, line_num) for tag_name, line_num, is_open in tag_list.entries if is_open]
+    return newlines, closes, opens
+
+
+def iter_file_errors(input_file, jobs=1):
+    """
+    Check an XML file in `jobs` processes and yield the same errors, in the same order, as
+    check_xml_consistency does for its lines.
+
+    Tag matching is bracket matching: every range of the file (see split_ranges) reduces on its own to
+    the closing tags it could not match followed by the tags it leaves open. The summaries are then
+    merged in file order on one stack: the unmatched closing tags of a range try to close what the
+    ranges before it left open, then its own open tags are pushed. Only the merge is sequential, and it
+    is proportional to the number of unmatched tags, not to the size of the file.
+    """
+    ranges = split_ranges(input_file, max(jobs, os.path.getsize(input_file) // PARALLEL_RANGE_SIZE))
+    tag_list = _TagStack()
+    line_offset = 0
+    executor = ProcessPoolExecutor(max_workers=jobs)
+    try:
+        summaries = executor.map(
+            _summarize_range,
+            itertools.repeat(input_file),
+            [start for start, end in ranges],
+            [end for start, end in ranges],
+        )
+        for newlines, closes, opens in summaries:
+            for line_num, tag_name in closes:
+                if not tag_list.close(tag_name):
+                    yield _unexpected_closing(line_offset + line_num, tag_name)
+            for tag_name, line_num in opens:
+                tag_list.push(tag_name, line_offset + line_num)
+            line_offset += newlines
+    finally:
+        # When the caller stops early (verify --max-errors), the ranges not started yet are dropped
+        executor.shutdown(wait=False, cancel_futures=True)
+    yield from _unclosed_errors(tag_list)
+
+
+def check_xml_consistency(xml_lines):
+    errors = list(iter_errors(iter_tags(xml_lines)))
+
     # return errors if exist and the list of errors
     return len(errors) == 0, errors
 
 
-def fix_xml_consistency(xml_lines, errors):
-    fixed_lines = xml_lines[:]
+def is_well_formed(input_file, chunk_size=CHUNK_SIZE):
+    """
+    Quick yes/no check of a whole file with the expat parser, which runs in C.
+
+    A file expat accepts has every tag properly nested, so there is nothing for the Python checker
+    to report (expat also knows that markup inside a CDATA section is text, which the line scanner
+    does not). Files expat rejects may only have problems the Python checker does not look for, such
+    as an undefined entity or two root elements, so they have to be checked again for its errors.
+    """
+    parser = expat.ParserCreate()
+    try:
+        with open(input_file, "rb") as file:
+            for chunk in iter(lambda: file.read(chunk_size), b""):
+                parser.Parse(chunk, False)
+        parser.Parse(b"", True)
+    except expat.ExpatError:
+        return False
+    return True
+
+
+def _print_errors(errors, max_errors):
+    """Print up to max_errors errors as JSON lines, close the generator and return (count, stopped_early)."""
+    count, stopped_early = 0, False
+    # One error past the limit is pulled but not printed: it means the limit cut the report short,
+    # and it is found without reading further than the error itself
+    limit = None if max_errors is None else max_errors + 1
+    for line_num, error in itertools.islice(errors, limit):
+        if count == max_errors:
+            stopped_early = True
+            break
+        print(json.dumps({"line": line_num, "error": error}), flush=True)
+        count += 1
+    errors.close()
+    return count, stopped_early
+
+
+def verify_stream(input_file, max_errors=None, jobs=1, chunk_size=CHUNK_SIZE):
+    """
+    Check an XML file of any size and print its errors as JSON lines while it is read.
+
+    The file is first checked with is_well_formed. Only if expat rejects it is it read again,
+    chunk_size characters at a time, keeping only the open tags, so memory follows the nesting depth
+    of the document and not its size. Every error is printed as soon as it is found, as
+    {"line": ..., "error": ...}, and a last line sums up the run.
+
+    Parameters:
+    -----------
+    input_file : str
+        Path to the XML file.
+    max_errors : int, optional
+        Stop reading once this many errors have been printed; the summary then tells whether there
+        were more (stopped_early).
+    jobs : int
+        Worker processes; with more than one the file is checked with iter_file_errors.
+
+    Returns:
+    --------
+    int
+        The number of errors printed, or None if the file could not be read.
+
+    Raises:
+    -------
+    ValueError
+        If max_errors is negative.
+    """
+    if max_errors is not None and max_errors < 0:
+        raise ValueError(f"max_errors must not be negative, not {max_errors}.")
+    try:
+        count, stopped_early = 0, False
+        if not is_well_formed(input_file, chunk_size):
+            if jobs > 1:
+                # The worker processes open the file themselves
+                count, stopped_early = _print_errors(iter_file_errors(input_file, jobs), max_errors)
+            else:
+                with open(input_file, "r") as file:
+                    errors = iter_errors(iter_chunk_tags(iter(lambda: file.read(chunk_size), "")))
+                    count, stopped_early = _print_errors(errors, max_errors)
+    except (FileNotFoundError, UnicodeDecodeError) as e:
+        print(f"Error: Cannot read '{input_file}': {e}")
+        return None
+
+    print(json.dumps({"valid": not (count or stopped_early), "errors": count, "stopped_early": stopped_early}))
+    return count
+
+
+def verify_file(input_file, chunk_size=CHUNK_SIZE):
+    """
+    Check one file the way verify_stream does and return its row of a directory report.
+
+    Returns:
+    --------
+    dict
+        file, status ("valid", "invalid" or "error" if it could not be read), errors (the number of
+        errors found), seconds and, for unreadable files, message.
+    """
+    started = time.perf_counter()
+    row = {"file": input_file, "status": "valid", "errors": 0}
+    try:
+        if not is_well_formed(input_file, chunk_size):
+            with open(input_file, "r") as file:
+                chunks = iter(lambda: file.read(chunk_size), "")
+                row["errors"] = sum(1 for _ in iter_errors(iter_chunk_tags(chunks)))
+            if row["errors"]:
+                row["status"] = "invalid"
+    except (OSError, UnicodeDecodeError) as e:
+        row["status"] = "error"
+        row["message"] = str(e)
+    row["seconds"] = time.perf_counter() - started
+    return row
+
+
+def verify_directory(input_dir, jobs=1, report_file=None):
+    """
+    Check every .xml file under a directory in a pool of `jobs` processes and write one JSON report.
+
+    Every worker checks many files, so small files do not each pay for starting an interpreter.
+
+    Parameters:
+    -----------
+    input_dir : str
+        The directory to search (with its subdirectories) for .xml files.
+    jobs : int
+        Worker processes.
+    report_file : str, optional
+        Where to save the report; it is printed when omitted.
+
+    Returns:
+    --------
+    dict
+        The report: totals per status and one verify_file row per file, or None if the directory
+        does not exist.
+
+    Example:
+    --------
+    ```python
+    verify_directory('exports/', jobs=8, report_file='verify-report.json')
+    ```
+    """
+    if not os.path.isdir(input_dir):
+        print(f"Error: The directory '{input_dir}' was not found.")
+        return None
+
+    files = sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(input_dir)
+        for name in names
+        if name.lower().endswith(".xml")
+    )
+    started = time.perf_counter()
+    if jobs > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            rows = list(executor.map(verify_file, files, chunksize=max(1, len(files) // (4 * jobs))))
+    else:
+        rows = [verify_file(path) for path in files]
+    for row in rows:
+        row["file"] = os.path.relpath(row["file"], input_dir)
+
+    report = {
+        "directory": input_dir,
+        "files": len(rows),
+        "valid": sum(row["status"] == "valid" for row in rows),
+        "invalid": sum(row["status"] == "invalid" for row in rows),
+        "error": sum(row["status"] == "error" for row in rows),
+        "seconds": time.perf_counter() - started,
+        "results": rows,
+    }
+    if report_file:
+        with open(report_file, "w") as file:
+            json.dump(report, file, indent=2)
+        print(
+            f"Checked {report['files']} files: {report['valid']} valid, {report['invalid']} invalid, "
+            f"{report['error']} unreadable. Report saved to {report_file}"
+        )
+    else:
+        print(json.dumps(report, indent=2))
+    return report
+
+
+def _line_ending(line):
+    return line[len(line.rstrip("\r\n")) :]
+
+
+def plan_fixes(xml_lines, errors):
+    """
+    Work out the repair of every error as a patch on the original lines, without changing them.
+
+    Patches refer to positions in xml_lines, so one repair never shifts the line numbers another
+    one depends on, and the fixed file can be produced in a single pass by apply_fixes.
+
+    Returns:
+    --------
+    tuple : (dict, dict, list)
+        - inserts: line index -> lines to insert before that line (index len(xml_lines) appends).
+        - replacements: line index -> the new text of that line.
+        - error_log: one message per applied fix.
+    """
+    inserts = {}
+    replacements = {}
     error_log = []
+    newline = _line_ending(xml_lines[0]) if xml_lines else "\n"
+    next_tag_line = None
 
     for line_num, error_msg in errors:
         if "has no closing tag" in error_msg:
@@ -100,24 +556,23 @@ def fix_xml_consistency(xml_lines, errors):
 
             # Locate the line with the opening tag
             open_tag_line = line_num - 1
-            for i in range(open_tag_line, len(fixed_lines)):
-                if f"<{tag_name}" in fixed_lines[i]:
+            for i in range(open_tag_line, len(xml_lines)):
+                if f"<{tag_name}" in replacements.get(i, xml_lines[i]):
                     open_tag_line = i
                     break
 
-            # Find the appropriate position to insert the closing tag
-            insertion_point = open_tag_line + 1
-            for i in range(open_tag_line + 1, len(fixed_lines)):
-                if (
-                    fixed_lines[i].strip().startswith("</")
-                    or "<" in fixed_lines[i].strip()
-                ):
-                    break
-                insertion_point = i + 1
-
-            fixed_lines.insert(
-                insertion_point,
-                f"</{tag_name}><!-- Error fixed: Added missing closing tag for <{tag_name}> -->\n",
+            if next_tag_line is None:
+                # next_tag_line[i]: the first line at or after i that holds a tag. Missing closing tags
+                # are reported after all unexpected closing tags, so the replacements are all known here.
+                next_tag_line = [len(xml_lines)] * (len(xml_lines) + 1)
+                for i in range(len(xml_lines) - 1, -1, -1):
+                    has_tag = "<" in replacements.get(i, xml_lines[i])
+                    next_tag_line[i] = i if has_tag else next_tag_line[i + 1]
+
+            # Insert the closing tag before the next line with a tag
+            insertion_point = next_tag_line[open_tag_line + 1]
+            inserts.setdefault(insertion_point, []).append(
+                f"</{tag_name}><!-- Error fixed: Added missing closing tag for <{tag_name}> -->{newline}"
             )
             error_log.append(
                 f"Added closing tag </{tag_name}> for <{tag_name}> starting on line {line_num}"
@@ -129,7 +584,6 @@ def fix_xml_consistency(xml_lines, errors):
 
             # Locate the line with the closing tag
             closing_tag_line = line_num - 1
-            content = fixed_lines[closing_tag_line].strip()
 
             # Set how many lines to check before the closing tag for content
             lines_to_check = 2
@@ -140,22 +594,45 @@ def fix_xml_consistency(xml_lines, errors):
                 if previous_line < 0:
                     break  # Don't go beyond the first line
 
-                content = fixed_lines[previous_line].strip()
+                content = replacements.get(previous_line, xml_lines[previous_line]).strip()
                 if content:  # Found non-empty content
                     # Add the opening tag before the found content
-                    fixed_lines[previous_line] = f"<{tag_name}> {content}"
-                    fixed_lines[closing_tag_line] = f"</{tag_name}>"
+                    replacements[previous_line] = f"<{tag_name}> {content}" + _line_ending(xml_lines[previous_line])
+                    replacements[closing_tag_line] = f"</{tag_name}>" + _line_ending(xml_lines[closing_tag_line])
                     break  # Stop once content is found and fixed
             else:
                 # If no content found in the range, insert opening tag before closing tag
-                fixed_lines.insert(closing_tag_line, f"<{tag_name}>")
+                inserts.setdefault(closing_tag_line, []).append(f"<{tag_name}>{newline}")
 
             # Log the error fix
             error_log.append(
                 f"Added missing opening tag <{tag_name}> on line {line_num} for existing closing tag."
             )
-            
-    return fixed_lines, error_log
+
+    return inserts, replacements, error_log
+
+
+def apply_fixes(xml_lines, inserts, replacements):
+    """
+    Yield the fixed lines: one merge pass over the original lines and the patches sorted by position.
+    Runs of unchanged lines are passed through as they are.
+    """
+    lines = iter(xml_lines)
+    position = 0
+    for index in sorted(inserts.keys() | replacements.keys()):
+        yield from itertools.islice(lines, index - position)
+        yield from inserts.get(index, ())
+        position = index
+        if index in replacements:
+            next(lines)
+            yield replacements[index]
+            position += 1
+    yield from lines
+
+
+def fix_xml_consistency(xml_lines, errors):
+    inserts, replacements, error_log = plan_fixes(xml_lines, errors)
+    return list(apply_fixes(xml_lines, inserts, replacements)), error_log
 
 
 def main():
@@ -163,16 +640,35 @@ def main():
     args = parse_arguments()  # Parse arguments from command line
     xml_path = args.input  # Get the input XML file path
 
+    if args.input_dir:
+        report = verify_directory(args.input_dir, args.jobs, args.report)
+        sys.exit(1 if report is None or report["invalid"] or report["error"] else 0)
+
+    if args.stream:
+        count = verify_stream(xml_path, args.max_errors, args.jobs)
+        sys.exit(1 if count is None or count else 0)
+
     # Validate XML file
     try:
-        with open(xml_path, "r") as file:
-            xml_lines = file.readlines()  # Read XML file into lines
+        if is_well_formed(xml_path):
+            # Accepted by expat: nothing for the detailed checker to find
+            xml_lines = None
+            is_valid, errors = True, []
+        elif args.jobs > 1:
+            # Check XML consistency in parallel, the lines are only read if they have to be fixed
+            xml_lines = None
+            errors = list(iter_file_errors(xml_path, args.jobs))
+            is_valid = len(errors) == 0
+        else:
+            with open(xml_path, "r") as file:
+                xml_lines = file.readlines()  # Read XML file into lines
+
+            # Check XML consistency
+            is_valid, errors = check_xml_consistency(xml_lines)
     except FileNotFoundError:
         print(f"Error: The file '{xml_path}' was not found.")
         return
 
-    # Check XML consistency
-    is_valid, errors = check_xml_consistency(xml_lines)
     if is_valid is None:
         return
 
@@ -186,7 +682,10 @@ def main():
 
     # If the --fix flag (-f) is set, attempt to fix the errors
     if args.fix:
-        fixed_lines, error_log = fix_xml_consistency(xml_lines, errors)
+        if xml_lines is None:
+            with open(xml_path, "r") as file:
+                xml_lines = file.readlines()
+        inserts, replacements, error_log = plan_fixes(xml_lines, errors)
 
         # Display applied fixes if any
         if error_log:
@@ -197,11 +696,11 @@ def main():
         # If --output is specified, write the fixed XML to the output file
         if args.output:
             with open(args.output, "w") as output_file:
-                output_file.writelines(fixed_lines)
+                output_file.writelines(apply_fixes(xml_lines, inserts, replacements))
             print(f"\nFixed XML saved to {args.output}")
         else:
             print("\nFixed XML (printed below):")
-            print("".join(fixed_lines))
+            print("".join(apply_fixes(xml_lines, inserts, replacements)))
 
 
 if __name__ == "__main__":
@@ -212,58 +711,44 @@ if __name__ == "__main__":
 
 # Time Complexity Explanation:
 #
-# The time complexity of the `check_xml_consistency` function depends on the operations
-# performed within the loops and the use of the stack.
+# `check_xml_consistency` walks a single stream of tags produced by `iter_tags`.
 #
-#  Outer Loop (Line Iteration):
-#    The function iterates through each line in `xml_lines` using `enumerate`, which runs in O(n) time
-#    where `n` is the number of lines in the XML input. This loop processes each line once.
+#  Tag Stream:
+#    `iter_tags` looks at every character of the input once (`find` for "<" and ">"), carrying an
+#    unfinished tag over to the next line, so producing all tags costs O(N) for N characters.
 #
-#  Inner Loop (Tag Parsing):
-#    Inside the outer loop, there is a while loop that scans for each tag within the current line.
-#    For each line, the `find` function is used to locate the positions of tags. In the worst case,
-#    the line could contain multiple tags, and the while loop will process each tag one by one. For
-#    a line with `m` tags, the `find` operation will be performed `m` times. However, we can simplify
-#    the complexity of the inner loop to O(L), where `L` is the maximum line length.
-#
-#
-#    For each closing tag (`</tag>`), the function looks for a matching opening tag in the list.
-#    In the worst case, the list may contain all previously encountered opening tags, so finding
-#    a match involves iterating through the list in reverse order, which can be as large as the number
-#    of tags processed so far.
+#  Open Tags:
+#    `_TagStack` keeps, for every tag name, the positions of its open tags. An opening tag is one
+#    append, and a closing tag takes the last position of its name, so each costs O(1). Closed entries
+#    are dropped from the top of the stack, and every entry is dropped at most once, so this is O(1)
+#    amortized, also on deep or broken files with thousands of unmatched tags.
 #
 # Remaining list Check:
-#    After processing all the lines, any remaining opening tags in the list are checked for unclosed
-#    tags. This operation contributes O(k) time, where `k` is the number of tags.
-#
-# Overall Time Complexity:
-#    The outer loop runs O(n), where `n` is the number of lines. For each line, the inner loop operates
-#    in O(L) for tag parsing, and the stack operations contribute O(k) time.
+#    Reporting the tags that are still open is one pass over the stack, O(k) for k tags.
 #
 # Final Big O Complexity:
-#    O(n * L)
-#    Where `n` is the number of lines in the XML, and `L` is the length of the longest line.
+#    O(N + k)
+#    Where `N` is the number of characters in the XML, and `k` is the number of tags.
+#
+# Parallel Check (`iter_file_errors`):
+#    Each of the `p` workers reduces its range in O(N / p + k / p). The merge only sees the tags a range
+#    could not match on its own, so the sequential part is O(u) for `u` unmatched tags, which is small
+#    next to `k` for well-formed or mostly well-formed files.
 
 
 # Time Complexity Explanation for fix_xml_consistency:
 
-# Iteration Over Errors:
-#    The function iterates through each error in the `errors` list. If there are `k` errors, this part will take O(k) time.
-
-# Finding and Inserting Closing Tags:
-#    For errors where a closing tag is missing, the function locates the appropriate line to insert the closing tag.
-#    This scan of the lines takes O(n) time, where `n` is the number of lines in the XML file. Inserting a closing tag
-#    into a list takes O(n) time, resulting in an O(n) time complexity for this operation.
-
-# Fixing Unexpected Closing Tags:
-#    For errors involving unexpected closing tags, the function searches for the content associated with the tag
-#    and either adds an opening tag or comments out a redundant closing tag. This scan also takes O(n) in the worst case.
+# Planning the Fixes (`plan_fixes`):
+#    Every error becomes a patch on the original lines: lines to insert before a line, or the new text of
+#    a line. Nothing is inserted into the list, so no line moves and each error costs O(1), apart from the
+#    first missing closing tag, which builds the "next line with a tag" table in one backwards pass, O(n).
 
-# Error Log Construction:
-#    Building the error log involves appending to a list, which is O(1) per operation and does not significantly affect
-#    the overall time complexity.
+# Applying the Fixes (`apply_fixes`):
+#    The patch positions are sorted once, O(k log k), and merged with the lines in a single pass that
+#    copies the unchanged runs through, O(n). The lines are yielded, so the CLI writes them straight to
+#    the output file without building a second copy of the document.
 
 # Overall Time Complexity:
-#    The function has a time complexity of O(k * n), where:
+#    The function has a time complexity of O(n + k log k), where:
 #    - `k` is the number of errors.
 #    - `n` is the number of lines in the XML file.
@@ -0,0 +1,340 @@
+import os
+import re
+import tempfile
+
+from json_utils import (
+    custom_dump, encode_string, get_tag_name, get_text_value, is_end_tag, is_start_tag, parse_tokens,
+)
+
+# Characters read from the input at a time
+CHUNK_SIZE = 1 << 20
+
+# Characters a pending sibling (see _Pending) keeps in memory before it moves to a temporary file
+SPOOL_SIZE = 1 << 20
+
+# Stands for a line break in pending siblings, so that the lines of their JSON text can be indented one
+# more level if they turn out to be the first item of a list; escaped JSON text never contains it
+BREAK = "\0"
+
+TOKEN = re.compile(r"<[^>]+>|[^<]+")
+
+
+def iter_tokens(xml_file, chunk_size=CHUNK_SIZE):
+    """
+    Reads an XML file in chunks and yields the same tokens as tokenize (tags and text).
+
+    A chunk is only tokenized up to its last "<": the text before a "<" is complete, and so is every
+    tag before it. The rest is carried over to the next chunk.
+
+    Args:
+        xml_file (file): The XML file, opened in text mode.
+        chunk_size (int): Characters read at a time.
+
+    Yields:
+        str: The tokens, in document order.
+
+    Time Complexity: O(n), where n is the length of the XML text.
+    Space Complexity: O(c), where c is the chunk size (plus the longest text token).
+    """
+    carry = ""
+    for chunk in iter(lambda: xml_file.read(chunk_size), ""):
+        buffer = carry + chunk
+        cut = buffer.rfind("<")
+        if cut == -1:
+            carry = buffer
+            continue
+        for match in TOKEN.finditer(buffer, 0, cut):
+            yield match.group()
+        carry = buffer[cut:]
+    for match in TOKEN.finditer(carry):
+        yield match.group()
+
+
+class _Output:
+    """The output file; line breaks are written as they are."""
+
+    def __init__(self, file):
+        self.file = file
+        self.line_break = "\n"
+
+    def write(self, text):
+        self.file.write(text)
+
+    def write_marked(self, text):
+        """Writes text from a pending sibling, whose line breaks are BREAK characters."""
+        self.file.write(text.replace(BREAK, "\n"))
+
+
+class _Pending:
+    """
+    The JSON text of the first sibling of its name, kept aside until it is known whether it is a
+    value of its own or the first item of a list.
+
+    The text is indented for the value of its own; line breaks are BREAK characters, so that it can
+    be indented one more level when it is moved into a list.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.parts = []
+        self.size = 0
+        self.file = None  # temporary file, once the text has grown beyond SPOOL_SIZE
+        self.line_break = BREAK
+
+    def write(self, text):
+        if self.file is not None:
+            self.file.write(text)
+            return
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size > SPOOL_SIZE:
+            self.file = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+            self.file.write("".join(self.parts))
+            self.parts = []
+
+    write_marked = write
+
+    def _chunks(self):
+        if self.file is None:
+            yield "".join(self.parts)
+            return
+        self.file.seek(0)
+        yield from iter(lambda: self.file.read(CHUNK_SIZE), "")
+        self.file.close()
+
+    def move_to(self, out, extra_indent=""):
+        """Copies the text to out, indenting every line by extra_indent, and discards it."""
+        for chunk in self._chunks():
+            if extra_indent:
+                chunk = chunk.replace(BREAK, BREAK + extra_indent)
+            out.write_marked(chunk)
+
+
+class _Element:
+    """
+    An open element: where its JSON value is written (out) and at which level.
+
+    kind is None until the value is known to be a text ("text") or an object of children ("dict");
+    an element with text ignores the children that come after it, like parse does ("skip").
+    """
+
+    def __init__(self, out, level, kind=None):
+        self.out = out
+        self.level = level
+        self.kind = kind
+        self.count = 0  # keys written so far
+        self.pending = None  # _Pending of the last child, while it may still become a list
+        self.list_name = None  # name of the child whose list is still open
+        self.names = set()  # names of the children seen so far
+
+
+class StreamingConverter:
+    """
+    Converts XML to JSON while it is read, writing the same JSON text as
+    custom_dumps(parse(xml_input), indent) for data documents (elements hold either text or
+    children, and children with the same name are next to each other).
+
+    parse turns repeated siblings into a list, so the JSON text of a child cannot be written before
+    the next sibling shows whether it is the first item of a list. Only that child is kept aside
+    (see _Pending); everything else goes straight to the output file. A kept-aside child that grows
+    beyond SPOOL_SIZE moves to a temporary file, so memory stays bounded whatever the document size.
+
+    Declarations, comments and self-closing tags are skipped.
+
+    Methods:
+        feed(token): Processes the next token from iter_tokens.
+        close(): Closes every open element and the JSON document.
+
+    Raises:
+        ValueError: If a sibling name comes back after a different sibling (the list would have to
+            start at a position that is already written), or if a closing tag has no opening tag.
+    """
+
+    def __init__(self, output_file, indent=4):
+        self.indent = indent
+        self.stack = [_Element(_Output(output_file), 0)]
+
+    def _break(self, out, level):
+        return out.line_break + " " * (level * self.indent)
+
+    def _flush(self, element):
+        # The last child turns out to be a value of its own
+        if element.pending is not None:
+            pending = element.pending
+            separator = "," if element.count else ""
+            element.out.write(f"{separator}{self._break(element.out, element.level + 1)}{encode_string(pending.name)}: ")
+            pending.move_to(element.out)
+            element.count += 1
+            element.pending = None
+        # The list of the last children ends
+        if element.list_name is not None:
+            element.out.write(f"{self._break(element.out, element.level + 1)}]")
+            element.list_name = None
+
+    def start(self, name):
+        parent = self.stack[-1]
+        if parent.kind in ("text", "skip"):
+            # parse drops the children of an element that already has text
+            self.stack.append(_Element(parent.out, parent.level, "skip"))
+            return
+        if parent.kind is None:
+            parent.out.write("{")
+            parent.kind = "dict"
+
+        out = parent.out
+        if parent.list_name == name:
+            # Another item of the open list
+            out.write(f",{self._break(out, parent.level + 2)}")
+            child = _Element(out, parent.level + 2)
+        elif parent.pending is not None and parent.pending.name == name:
+            # The second sibling of its name: the first one starts a list
+            separator = "," if parent.count else ""
+            out.write(f"{separator}{self._break(out, parent.level + 1)}{encode_string(name)}: [{self._break(out, parent.level + 2)}")
+            parent.pending.move_to(out, " " * self.indent)
+            out.write(f",{self._break(out, parent.level + 2)}")
+            parent.count += 1
+            parent.pending = None
+            parent.list_name = name
+            child = _Element(out, parent.level + 2)
+        else:
+            self._flush(parent)
+            if name in parent.names:
+                raise ValueError(f"<{name}> repeats after a different sibling; it cannot be streamed as a list.")
+            parent.names.add(name)
+            parent.pending = _Pending(name)
+            child = _Element(parent.pending, parent.level + 1)
+        self.stack.append(child)
+
+    def text(self, value):
+        element = self.stack[-1]
+        if len(self.stack) > 1 and element.kind is None:
+            element.out.write(encode_string(value))
+            element.kind = "text"
+
+    def end(self):
+        if len(self.stack) == 1:
+            raise ValueError("Closing tag without an opening tag.")
+        self._close(self.stack.pop())
+
+    def _close(self, element):
+        if element.kind is None:
+            # No text and no children: an empty object
+            out = element.out
+            out.write(f"{{{self._break(out, element.level + 1)}{self._break(out, element.level)}}}")
+        elif element.kind == "dict":
+            self._flush(element)
+            element.out.write(f"{self._break(element.out, element.level)}}}")
+
+    def feed(self, token):
+        if is_start_tag(token):
+            if token.startswith("<?") or token.startswith("<!"):
+                return
+            self.start(get_tag_name(token))
+        elif is_end_tag(token):
+            self.end()
+        elif not token.startswith("<"):
+            value = get_text_value(token)
+            if value:  # Ignore empty or whitespace-only text nodes
+                self.text(value)
+
+    def close(self):
+        while len(self.stack) > 1:
+            self._close(self.stack.pop())
+        self._close(self.stack.pop())
+
+
+def convert_stream(input_file, output_file, indent=4, chunk_size=CHUNK_SIZE):
+    """
+    Converts an XML file to a JSON file with StreamingConverter, without holding either in memory.
+
+    The JSON text goes to output_file + ".part", which only replaces output_file once the whole
+    document is converted, so a failure never leaves a partial JSON file behind.
+
+    Args:
+        input_file (str): Path to the XML file.
+        output_file (str): Path to the JSON file to write.
+        indent (int): Number of spaces for pretty-printing.
+
+    Raises:
+        ValueError: If the document cannot be streamed (see StreamingConverter).
+
+    Time Complexity: O(n), where n is the length of the XML text; a child that starts a list is copied once more.
+    Space Complexity: O(c + d), for the chunk size c and the depth d of the document.
+    """
+    partial_file = output_file + ".part"
+    try:
+        with open(input_file, "r") as xml_file, open(partial_file, "w") as json_file:
+            converter = StreamingConverter(json_file, indent)
+            for token in iter_tokens(xml_file, chunk_size):
+                converter.feed(token)
+            converter.close()
+        os.replace(partial_file, output_file)
+    except BaseException:
+        if os.path.exists(partial_file):
+            os.remove(partial_file)
+        raise
+
+
+def iter_records(tokens, record):
+    """
+    Groups a token stream into the subtrees of the elements named record, as soon as each one closes.
+
+    A record inside another record belongs to the outer one. Declarations and comments are dropped,
+    as in StreamingConverter.
+
+    Args:
+        tokens (iterable): Tokens from iter_tokens.
+        record (str): The tag name of the repeating element, such as "user".
+
+    Yields:
+        list: The tokens of one record, from its start tag to its end tag.
+
+    Time Complexity: O(t), where t is the number of tokens.
+    Space Complexity: O(r), where r is the number of tokens of the largest record.
+    """
+    depth = 0
+    record_depth = None  # depth of the open record, if any
+    tokens_of_record = []
+    for token in tokens:
+        if is_start_tag(token):
+            if token.startswith("<?") or token.startswith("<!"):
+                continue
+            if record_depth is None and get_tag_name(token) == record:
+                record_depth = depth
+            depth += 1
+        elif is_end_tag(token):
+            depth -= 1
+
+        if record_depth is not None:
+            tokens_of_record.append(token)
+            if depth == record_depth:
+                yield tokens_of_record
+                tokens_of_record = []
+                record_depth = None
+
+
+def convert_jsonl(input_file, output_file, record, chunk_size=CHUNK_SIZE):
+    """
+    Writes every <record> element of an XML file as one compact JSON line, as soon as it closes.
+
+    Each line is the value parse gives the element (an object of its children, or its text), so
+    loaders can read the output in parallel, and while it is still being written.
+
+    Args:
+        input_file (str): Path to the XML file.
+        output_file (str): Path to the JSON Lines file to write.
+        record (str): The tag name of the repeating element, such as "user".
+
+    Returns:
+        int: The number of records written.
+
+    Time Complexity: O(n), where n is the length of the XML text.
+    Space Complexity: O(c + r), for the chunk size c and the size r of the largest record.
+    """
+    count = 0
+    with open(input_file, "r") as xml_file, open(output_file, "w") as jsonl_file:
+        for tokens in iter_records(iter_tokens(xml_file, chunk_size), record):
+            custom_dump(parse_tokens(tokens)[record], jsonl_file)
+            jsonl_file.write("\n")
+            count += 1
+    return count
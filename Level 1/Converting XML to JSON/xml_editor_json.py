@@ -1,32 +1,59 @@
 import argparse
-from json_utils import custom_dumps, parse
+import sys
+from json_utils import custom_dump, parse_file
+from json_stream import convert_jsonl, convert_stream
 
-# Main function to convert input XML file to output JSON file
-def xml_editor_json(input_file, output_file):
-    # Read the input XML file
-    with open(input_file, 'r') as xml_file:
-        xml_data = xml_file.read()
-    
-    # Parse the XML data to a dictionary
-    data_dict = parse(xml_data)
-    
-    # Convert the dictionary to JSON
-    json_data = custom_dumps(data_dict, indent=4)
+# Main function to convert input XML file to output JSON file; returns False if nothing was written
+def xml_editor_json(input_file, output_file, stream=False, jsonl_record=None, select=None):
+    if select and (stream or jsonl_record):
+        print("Error: --select cannot be combined with --stream or --jsonl.")
+        return False
+
+    if jsonl_record:
+        # One compact JSON line per <jsonl_record> element, written as soon as it closes
+        count = convert_jsonl(input_file, output_file, jsonl_record)
+        print(f"Wrote {count} <{jsonl_record}> records to {output_file}")
+        return True
+
+    if stream:
+        # Convert while reading, without the whole file, dictionary or JSON text in memory; on an
+        # error the output file is left untouched
+        try:
+            convert_stream(input_file, output_file)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return False
+        return True
+
+    # Parse the XML file to a dictionary, straight from a memory map of it; with select, only the
+    # selected paths are built and every other element is skipped unread
+    data_dict = parse_file(input_file, select)
     
-    # Write the JSON data to the output file
+    # Convert the dictionary to JSON, written straight to the output file
     with open(output_file, 'w') as json_file:
-        json_file.write(json_data)
+        custom_dump(data_dict, json_file, indent=4)
+    return True
 
 def main():
     parser = argparse.ArgumentParser(description="Convert XML to JSON.")
     parser.add_argument('-i', '--input', required=True, help="Input XML file")
     parser.add_argument('-o', '--output', required=True, help="Output JSON file")
+    parser.add_argument('--stream', action='store_true',
+                        help="Convert while reading, for files larger than memory; elements with the same name "
+                             "must be next to each other")
+    parser.add_argument('--jsonl', action='store_true', help="Write one JSON line per record element")
+    parser.add_argument('--record', help="Tag name of the record element (needs --jsonl, default: user)")
+    parser.add_argument('--select', help="Comma-separated paths to keep, such as users/user/id,users/user/name")
     
     # Parse the arguments
     args = parser.parse_args()
+    if args.record is not None and not args.jsonl:
+        parser.error("--record only works with --jsonl")
     
     # Call the function to convert XML to JSON
-    xml_editor_json(args.input, args.output)
+    if not xml_editor_json(args.input, args.output, args.stream, (args.record or "user") if args.jsonl else None,
+                           args.select.split(",") if args.select else None):
+        sys.exit(1)
     
 if __name__ == "__main__":
     main()
\ No newline at end of file